@@ -0,0 +1,125 @@
+"""
+bench_utils.py: Helpers shared by the benchmarks. A fake OpenAI compatible LLM that echoes the last message after a
+fixed latency, the environment that points lazy-mcp at it from a fresh config dir, and websocket chat clients. Run as a
+script it serves the fake LLM:
+
+    python benchmarks/bench_utils.py --port 8100 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import httpx
+import websockets
+
+
+def free_port() -> int:
+    """Return a port nobody listens on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    """Wait until a local port accepts connections."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1.0).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"nothing listens on port {port}")
+            time.sleep(0.1)
+
+
+def run_fake_llm(port: int, latency: float) -> None:
+    """Serve chat completions answering every message with a short echo after latency seconds."""
+    import uvicorn
+    from fastapi import FastAPI, Request
+
+    app = FastAPI()
+
+    @app.post("/{path:path}")
+    async def complete(path: str, request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        content = f"echo: {body['messages'][-1].get('content')}"
+        return {
+            "id": "fake",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "fake",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        }
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+@contextmanager
+def fake_llm(latency: float) -> Iterator[int]:
+    """Run the fake LLM in a subprocess and yield its port."""
+    port = free_port()
+    llm = subprocess.Popen([sys.executable, __file__, "--port", str(port), "--latency", str(latency)])
+    try:
+        wait_for_port(port)
+        yield port
+    finally:
+        llm.terminate()
+        llm.wait()
+
+
+def fake_llm_env(home: str, llm_port: int) -> dict[str, str]:
+    """Return the environment variables that point lazy-mcp at a config dir in home and at the fake LLM."""
+    return {
+        "XDG_CONFIG_HOME": home,
+        "AZURE_OPENAI_KEY": "fake",
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{llm_port}",
+        "AZURE_OPENAI_DEPLOYMENT": "fake",
+    }
+
+
+async def wait_ready(port: int, workers: int = 1, timeout: float = 60.0) -> None:
+    """Wait until every worker of lazy-mcp answers."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        for worker in range(workers):
+            while True:
+                try:
+                    if (await client.get(f"http://127.0.0.1:{port}/agents", params={"worker": worker})).is_success:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"lazy-mcp on port {port} did not start")
+                await asyncio.sleep(0.2)
+
+
+async def chat(port: int, agent: str, turns: int) -> None:
+    """Run turns chat turns with an agent, each waiting for the reply of the previous one."""
+    async with websockets.connect(f"ws://127.0.0.1:{port}/chat", max_size=None) as ws:
+        for turn in range(turns):
+            await ws.send(json.dumps({"agent": agent, "message": f"turn {turn}"}))
+            while "reply" not in json.loads(await ws.recv()):
+                pass
+
+
+def main() -> None:
+    """Serve the fake LLM."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, required=True, help="port to listen on")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per completion")
+    args = parser.parse_args()
+    run_fake_llm(args.port, args.latency)
+
+
+if __name__ == "__main__":
+    main()
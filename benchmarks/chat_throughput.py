@@ -0,0 +1,77 @@
+"""
+chat_throughput.py: Aggregate chat throughput of lazy-mcp by number of worker processes.
+Starts the fake LLM of bench_utils with a fixed latency, then for every worker count a lazy-mcp deployment in a fresh
+config dir, and lets concurrent websocket clients chat with their own agents. Reports completed turns per second.
+
+    python benchmarks/chat_throughput.py --workers 1 2 4 --clients 64 --turns 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_utils import chat, fake_llm, fake_llm_env, free_port, wait_ready
+
+
+async def measure(port: int, agents: list[str], turns: int) -> float:
+    """Return the turns per second of concurrent clients, one per agent."""
+    started = time.monotonic()
+    await asyncio.gather(*(chat(port, agent, turns) for agent in agents))
+    return len(agents) * turns / (time.monotonic() - started)
+
+
+def run_deployment(workers: int, args: argparse.Namespace, llm_port: int) -> float:
+    """Start lazy-mcp with a number of workers in a fresh config dir and return its throughput."""
+    with tempfile.TemporaryDirectory() as home:
+        config_dir = Path(home) / "lazy_mcp"
+        config_dir.mkdir()
+        agents = [f"bench-{i}" for i in range(args.clients)]
+        for agent in agents:
+            (config_dir / f"{agent}.json").write_text(json.dumps({"description": "Benchmark agent", "servers": {}}))
+        port = free_port()
+        env = {**os.environ, **fake_llm_env(home, llm_port), "LAZY_MCP_STORE": args.store}
+        # the cwd keeps a .env with real credentials from being picked up
+        server = subprocess.Popen(
+            [sys.executable, "-m", "lazy_mcp", "--port", str(port), "--workers", str(workers), "--no-browser"],
+            env=env,
+            cwd=home,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            asyncio.run(wait_ready(port, workers))
+            # a first turn per agent loads them, so the measurement sees resident agents only
+            asyncio.run(measure(port, agents, 1))
+            return asyncio.run(measure(port, agents, args.turns))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main() -> None:
+    """Run the benchmark for all requested worker counts."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to compare")
+    parser.add_argument("--clients", type=int, default=64, help="concurrent clients, each with its own agent")
+    parser.add_argument("--turns", type=int, default=20, help="turns per client")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the fake LLM takes per completion")
+    parser.add_argument("--store", choices=["json", "sqlite"], default="json", help="agent store backend")
+    args = parser.parse_args()
+
+    with fake_llm(args.latency) as llm_port:
+        baseline = None
+        print(f"{'workers':>8} {'turns/s':>10} {'speedup':>8}")
+        for workers in args.workers:
+            throughput = run_deployment(workers, args, llm_port)
+            baseline = baseline or throughput
+            print(f"{workers:>8} {throughput:>10.1f} {throughput / baseline:>7.2f}x", flush=True)
+
+
+if __name__ == "__main__":
+    main()
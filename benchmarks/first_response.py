@@ -0,0 +1,129 @@
+"""
+first_response.py: First-response latency of an agent with several stdio MCP servers, with lazy_connect on and off.
+Starts the fake LLM of bench_utils and, in a fresh config dir, an agent whose servers are this script in MCP server
+mode. Every run is a fresh process that loads the agent, loads all its servers and gets the reply to a first message.
+With lazy_connect the tool catalogs come from the snapshots in the config and no server is spawned before its first
+call.
+
+    python benchmarks/first_response.py --servers 4 --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_utils import fake_llm, fake_llm_env
+
+
+def run_mcp_server() -> None:
+    """Serve a few tools over stdio."""
+    from mcp.server.fastmcp import FastMCP
+
+    server = FastMCP("bench", log_level="WARNING")
+
+    @server.tool()
+    def echo(text: str) -> str:
+        """Return the text."""
+        return text
+
+    @server.tool()
+    def add(a: int, b: int) -> int:
+        """Add two numbers."""
+        return a + b
+
+    server.run()
+
+
+async def first_response(agent: str) -> float:
+    """Load an agent and all its servers, get the reply to a first message and return the seconds it took."""
+    from lazy_mcp.llm_client import LLMClient
+
+    started = time.monotonic()
+    llm = LLMClient(agent)
+    await asyncio.gather(*(llm.load_mcp(name) for name in llm.agent_config.servers))
+    await llm.ask_llm_with_tools("hello")
+    return time.monotonic() - started
+
+
+def run_once(agent: str) -> None:
+    """Print the first-response latency of an agent in a process without resident agents and servers."""
+    print(asyncio.run(first_response(agent)), flush=True)
+    # the server processes exit once the pipes of this process are closed
+    os._exit(0)
+
+
+def write_agent(config_dir: Path, agent: str, servers: int, lazy_connect: bool) -> None:
+    """Write an agent configuration with servers stdio servers running this script."""
+    config = {
+        "description": "Benchmark agent",
+        "servers": {
+            f"server{i}": {
+                "type": "stdio",
+                "command": sys.executable,
+                "args": [str(Path(__file__).resolve()), "--mcp-server"],
+                "lazy_connect": lazy_connect,
+            }
+            for i in range(servers)
+        },
+    }
+    (config_dir / f"{agent}.json").write_text(json.dumps(config))
+
+
+def measure(home: str, llm_port: int, servers: int, runs: int) -> dict[bool, list[float]]:
+    """Return the first-response latencies by lazy_connect, each after one run that fills the tool snapshots."""
+    config_dir = Path(home) / "lazy_mcp"
+    config_dir.mkdir()
+    env = {**os.environ, **fake_llm_env(home, llm_port)}
+    latencies = {}
+    for lazy_connect in (False, True):
+        agent = f"bench-{'lazy' if lazy_connect else 'eager'}"
+        write_agent(config_dir, agent, servers, lazy_connect)
+        times = []
+        for _ in range(runs + 1):
+            # the cwd keeps a .env with real credentials from being picked up
+            result = subprocess.run(
+                [sys.executable, __file__, "--run", agent],
+                env=env,
+                cwd=home,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            times.append(float(result.stdout.split()[-1]))
+        latencies[lazy_connect] = times[1:]
+    return latencies
+
+
+def main() -> None:
+    """Run the benchmark with lazy_connect off and on."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=4, help="stdio MCP servers of the agent")
+    parser.add_argument("--runs", type=int, default=5, help="measured runs per setting, the median is reported")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the fake LLM takes per completion")
+    parser.add_argument("--mcp-server", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--run", metavar="AGENT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mcp_server:
+        run_mcp_server()
+        return
+    if args.run:
+        run_once(args.run)
+        return
+
+    with fake_llm(args.latency) as llm_port, tempfile.TemporaryDirectory() as home:
+        latencies = measure(home, llm_port, args.servers, args.runs)
+
+    print(f"{'lazy_connect':<14} {'median ms':>10} {'min ms':>8}")
+    for lazy_connect, times in latencies.items():
+        print(f"{str(lazy_connect):<14} {statistics.median(times) * 1000:>10.1f} {min(times) * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
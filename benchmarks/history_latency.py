@@ -0,0 +1,111 @@
+"""
+history_latency.py: Latency of /history while other agents chat, which stays flat as long as completions do not block
+the event loop. Starts the fake LLM of bench_utils with a fixed delay and a lazy-mcp server in a fresh config dir, then
+measures /history of one agent idle and while concurrent websocket clients chat with their own agents. Reports p50 and
+p99 of both.
+
+    python benchmarks/history_latency.py --clients 32 --requests 200 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import websockets
+from bench_utils import chat, fake_llm, fake_llm_env, free_port, wait_ready
+
+# agent whose history is requested, it chats only before the measurements
+PROBE_AGENT = "probe"
+
+
+async def chat_until(port: int, agent: str, stop: asyncio.Event) -> int:
+    """Chat with an agent turn after turn until stop is set and return the number of completed turns."""
+    turns = 0
+    async with websockets.connect(f"ws://127.0.0.1:{port}/chat", max_size=None) as ws:
+        while not stop.is_set():
+            await ws.send(json.dumps({"agent": agent, "message": f"turn {turns}"}))
+            while "reply" not in json.loads(await ws.recv()):
+                pass
+            turns += 1
+    return turns
+
+
+async def history_latencies(port: int, agent: str, requests: int) -> list[float]:
+    """Return the latencies of sequential /history requests of an agent in milliseconds."""
+    latencies = []
+    async with httpx.AsyncClient() as client:
+        for _ in range(requests):
+            started = time.monotonic()
+            (await client.get(f"http://127.0.0.1:{port}/history", params={"agent": agent})).raise_for_status()
+            latencies.append((time.monotonic() - started) * 1000)
+    return latencies
+
+
+async def measure(port: int, agents: list[str], requests: int) -> tuple[list[float], list[float], int]:
+    """Return the /history latencies without and with chatting clients, and the turns completed meanwhile."""
+    await wait_ready(port)
+    # a few turns load the probe agent and give it a short history
+    await chat(port, PROBE_AGENT, 3)
+    idle = await history_latencies(port, PROBE_AGENT, requests)
+
+    stop = asyncio.Event()
+    chats = [asyncio.create_task(chat_until(port, agent, stop)) for agent in agents]
+    # every client has sent its first message before the measurement starts
+    await asyncio.sleep(0.5)
+    loaded = await history_latencies(port, PROBE_AGENT, requests)
+    stop.set()
+    turns = sum(await asyncio.gather(*chats))
+    return idle, loaded, turns
+
+
+def percentile(latencies: list[float], p: int) -> float:
+    """Return the p-th percentile of latencies."""
+    return statistics.quantiles(latencies, n=100, method="inclusive")[p - 1]
+
+
+def main() -> None:
+    """Run the benchmark and print the latency percentiles."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent chat clients, each with its own agent")
+    parser.add_argument("--requests", type=int, default=200, help="/history requests per measurement")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds the fake LLM takes per completion")
+    args = parser.parse_args()
+
+    with fake_llm(args.latency) as llm_port, tempfile.TemporaryDirectory() as home:
+        config_dir = Path(home) / "lazy_mcp"
+        config_dir.mkdir()
+        agents = [f"bench-{i}" for i in range(args.clients)]
+        for agent in agents + [PROBE_AGENT]:
+            (config_dir / f"{agent}.json").write_text(json.dumps({"description": "Benchmark agent", "servers": {}}))
+        port = free_port()
+        # the cwd keeps a .env with real credentials from being picked up
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "lazy_mcp.api:app", "--port", str(port), "--log-level", "warning"],
+            env={**os.environ, **fake_llm_env(home, llm_port)},
+            cwd=home,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            idle, loaded, turns = asyncio.run(measure(port, agents, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'/history':<24} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'idle':<24} {percentile(idle, 50):>8.1f} {percentile(idle, 99):>8.1f}")
+    label = f"{args.clients} chatting clients"
+    print(f"{label:<24} {percentile(loaded, 50):>8.1f} {percentile(loaded, 99):>8.1f}")
+    print(f"chat turns completed during the measurement: {turns}")
+
+
+if __name__ == "__main__":
+    main()
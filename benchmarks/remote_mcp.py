@@ -0,0 +1,122 @@
+"""
+remote_mcp.py: Check of the streamable HTTP transport against a local in-process MCP server.
+Serves a FastMCP app with uvicorn in the same event loop and lets the clients of two agents list and call its tools.
+Checks that they share one pooled session, that a call after a server restart reconnects the session, that calls fail
+fast while the server is down and that the session recovers once it is back. Prints the timings and exits with 1 if a
+check fails.
+
+    python benchmarks/remote_mcp.py
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Optional
+
+import uvicorn
+from bench_utils import free_port
+from mcp.server.fastmcp import FastMCP
+
+
+class LocalServer:
+    """FastMCP app served over streamable HTTP by uvicorn in the running event loop."""
+
+    def __init__(self, port: int) -> None:
+        """Initialize the server for a local port."""
+        self.port: int = port
+        self.server: Optional[uvicorn.Server] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Start a fresh server, which knows no sessions of a previous one, and wait until it accepts connections."""
+        mcp = FastMCP("remote", log_level="WARNING")
+
+        @mcp.tool()
+        def add(a: int, b: int) -> int:
+            """Add two numbers."""
+            return a + b
+
+        # uvicorn logs the lifespan cancelled by a forced stop as error
+        config = uvicorn.Config(mcp.streamable_http_app(), port=self.port, log_level="critical")
+        self.server = uvicorn.Server(config)
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.05)
+
+    async def stop(self) -> None:
+        """Stop the server, dropping open streams."""
+        self.server.should_exit = True
+        self.server.force_exit = True
+        await self.task
+
+
+async def check(port: int) -> list[str]:
+    """Run the checks and return the failed ones."""
+    from lazy_mcp.mcp_client import MCPClient
+    from lazy_mcp.mcp_pool import mcp_pool
+    from lazy_mcp.models import MCPServerConfig
+
+    failures = []
+
+    def expect(condition: bool, message: str) -> None:
+        print(("ok     " if condition else "FAILED ") + message)
+        if not condition:
+            failures.append(message)
+
+    url = f"http://127.0.0.1:{port}/mcp"
+    server = LocalServer(port)
+    await server.start()
+    # the clients of two agents using the same server
+    first = MCPClient("remote", MCPServerConfig(type="http", url=url, lazy_connect=False))
+    second = MCPClient("remote", MCPServerConfig(type="http", url=url, lazy_connect=False))
+    try:
+        started = time.monotonic()
+        tools = [tool.name for tool in (await first.list_tools()).tools]
+        expect(tools == ["add"], f"listing returns {tools} in {time.monotonic() - started:.2f} s")
+        results = await asyncio.gather(
+            first.call_tool("add", {"a": 1, "b": 2}), second.call_tool("add", {"a": 3, "b": 4})
+        )
+        expect([r.content[0].text for r in results] == ["3", "7"], "both agents call the tool")
+        stats = mcp_pool.stats()
+        expect(stats.live == 1 and stats.misses == 1, f"one shared session: {stats.live} live, {stats.misses} connect")
+
+        await server.stop()
+        await server.start()
+        started = time.monotonic()
+        result = await first.call_tool("add", {"a": 2, "b": 2})
+        expect(
+            result.content[0].text == "4" and mcp_pool.restarts == 1,
+            f"call after a server restart reconnects in {time.monotonic() - started:.2f} s",
+        )
+
+        await server.stop()
+        started = time.monotonic()
+        try:
+            await second.call_tool("add", {"a": 1, "b": 1})
+            expect(False, "call while the server is down fails")
+        except ConnectionError:
+            expect(True, f"call while the server is down fails after {time.monotonic() - started:.2f} s")
+
+        await server.start()
+        result = await second.call_tool("add", {"a": 5, "b": 5})
+        expect(result.content[0].text == "10", "call once the server is back reconnects")
+    finally:
+        await first.close()
+        await second.close()
+        await mcp_pool.close_all()
+        await server.stop()
+    return failures
+
+
+def main() -> None:
+    """Run the checks against a server on a free port."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds all checks may take")
+    args = parser.parse_args()
+    failures = asyncio.run(asyncio.wait_for(check(free_port()), args.timeout))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
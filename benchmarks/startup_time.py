@@ -0,0 +1,119 @@
+"""
+startup_time.py: Startup time of the lazy-mcp entry point, with a budget that fails when the import time regresses.
+Measures the cumulative import time of the entry point and the API (python -X importtime) in fresh interpreters, checks
+that the LLM and MCP clients are not imported before the first agent is used, and times a single-worker server from
+launch until it answers and until its first agent is loaded. Exits with 1 if the median import time of the API exceeds
+the budget or a deferred module is imported at startup.
+
+    python benchmarks/startup_time.py --runs 5 --budget-ms 1000
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from bench_utils import free_port
+
+# imported with the first agent, never while the server starts
+DEFERRED_MODULES = ["openai", "mcp", "dotenv", "lazy_mcp.llm_client"]
+
+
+def import_time(module: str) -> float:
+    """Return the cumulative import time of a module in a fresh interpreter in milliseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def deferred_imports(module: str) -> list[str]:
+    """Return the deferred modules that importing a module imports."""
+    check = f"import sys, {module}; print(' '.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def wait_until(client: httpx.Client, url: str, started: float, timeout: float = 60.0) -> float:
+    """Poll url until it answers successfully and return the seconds since started."""
+    while True:
+        try:
+            if client.get(url).is_success:
+                return time.monotonic() - started
+        except httpx.TransportError:
+            pass
+        if time.monotonic() - started > timeout:
+            raise TimeoutError(f"{url} did not answer within {timeout} seconds")
+        time.sleep(0.01)
+
+
+def server_startup() -> tuple[float, float]:
+    """Start lazy-mcp in a fresh config dir and return the seconds until it answers and until its first agent loaded."""
+    with tempfile.TemporaryDirectory() as home:
+        port = free_port()
+        env = {
+            **os.environ,
+            "XDG_CONFIG_HOME": home,
+            "AZURE_OPENAI_KEY": "fake",
+            "AZURE_OPENAI_ENDPOINT": "http://127.0.0.1:1",
+            "AZURE_OPENAI_DEPLOYMENT": "fake",
+        }
+        started = time.monotonic()
+        # the cwd keeps a .env with real credentials from being picked up
+        server = subprocess.Popen(
+            [sys.executable, "-m", "lazy_mcp", "--port", str(port), "--no-browser"],
+            env=env,
+            cwd=home,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            with httpx.Client() as client:
+                ready = wait_until(client, f"http://127.0.0.1:{port}/agents", started)
+                first_agent = wait_until(client, f"http://127.0.0.1:{port}/agent_config?agent=startup", started)
+            return ready, first_agent
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main() -> None:
+    """Run the measurements and check the budget."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="measurements per figure, the median is reported")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="budget of the median import time of the API")
+    parser.add_argument("--no-server", action="store_false", dest="server", help="only measure the imports")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'import':<20} {'median ms':>10} {'min ms':>8}")
+    for module in ("lazy_mcp.__main__", "lazy_mcp.api"):
+        times = [import_time(module) for _ in range(args.runs)]
+        print(f"{module:<20} {statistics.median(times):>10.1f} {min(times):>8.1f}")
+        if module == "lazy_mcp.api" and statistics.median(times) > args.budget_ms:
+            print(f"import of {module} exceeds the budget of {args.budget_ms:.0f} ms")
+            failed = True
+        eager = deferred_imports(module)
+        if eager:
+            print(f"{module} imports {', '.join(eager)}, which should be deferred until an agent is used")
+            failed = True
+
+    if args.server:
+        runs = [server_startup() for _ in range(args.runs)]
+        print(f"{'server':<20} {'median ms':>10} {'min ms':>8}")
+        for label, times in (("ready", [r for r, _ in runs]), ("first agent", [a for _, a in runs])):
+            print(f"{label:<20} {statistics.median(times) * 1000:>10.1f} {min(times) * 1000:>8.1f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,12 +13,14 @@ import { useChatWebSocketEffect } from './hooks/useChatWebSocketEffect';
 function App() {
   // Use custom hooks for state and logic
   const { agent, setAgent, agents, setAgents, fetchAgents, handleDeleteAgent } = useAgents('default');
-  const { messages, setMessages, fetchHistory } = useChatHistory(agent);
-  const { logs, setLogs, fetchLogs } = useLogs(agent);
+  const { messages, setMessages, fetchHistory, fetchOlder, fetchNewer, hasMore } = useChatHistory(agent);
+  const { logs, setLogs } = useLogs(agent);
   const [input, setInput] = useState('');
   const [deleteAgent, setDeleteAgent] = useState("");
   const [lastTokensUsed, setLastTokensUsed] = useState(0);
   const [accumTokens, setAccumTokens] = useState(0);
+  const [lastUsage, setLastUsage] = useState(null);
+  const [busy, setBusy] = useState(false);
   const messagesEndRef = useRef(null);
   const [toolCallPending, setToolCallPending] = useState(null);
   const [toolCallResolve, setToolCallResolve] = useState(null);
@@ -33,21 +35,15 @@ function App() {
     fetchHistory(agent);
   }, [agent, fetchHistory]);
 
-  useEffect(() => {
-    fetchLogs(); // initial fetch
-    const interval = setInterval(fetchLogs, 3000); // poll every 3 seconds
-    return () => clearInterval(interval);
-  }, [fetchLogs]);
-
   useEffect(() => {
     if (messagesEndRef.current) {
       messagesEndRef.current.scrollIntoView({ behavior: 'smooth' });
     }
   }, [messages]);
 
-  const handleToolCallConfirm = (confirmationState) => {
+  const handleToolCallConfirm = (confirmationStates) => {
     if (ws.current && toolCallPending) {
-      ws.current.send(JSON.stringify({ tool_call_confirmed: confirmationState }));
+      ws.current.send(JSON.stringify({ tool_calls_confirmed: confirmationStates }));
       setToolCallPending(null);
       if (toolCallResolve) {
         toolCallResolve();
@@ -60,8 +56,13 @@ function App() {
     e.preventDefault();
     if (!input.trim()) return;
     setMessages(msgs => [...msgs, { role: 'user', content: input }]);
-    ws.current.send(JSON.stringify({ agent, message: input }));
+    ws.current.send(JSON.stringify({ agent, message: input, stream: true, timeline: true }));
     setInput('');
+    setBusy(true);
+  };
+
+  const stopTurn = () => {
+    if (ws.current) ws.current.send(JSON.stringify({ stop: true }));
   };
 
   // Listen for chat response and update token counters
@@ -72,7 +73,10 @@ function App() {
     setLastTokensUsed,
     setAccumTokens,
     setToolCallPending,
-    setToolCallResolve
+    setToolCallResolve,
+    fetchNewer,
+    setLastUsage,
+    setBusy
   );
 
   // Reset accumulated tokens when agent changes
@@ -104,6 +108,8 @@ function App() {
       >
         <ChatWindow
           messages={messages}
+          hasMore={hasMore}
+          fetchOlder={fetchOlder}
           input={input}
           setInput={setInput}
           sendMessage={sendMessage}
@@ -117,7 +123,10 @@ function App() {
           setDeleteAgent={setDeleteAgent}
           handleDeleteAgent={handleDeleteAgent}
           lastTokensUsed={lastTokensUsed}
+          lastUsage={lastUsage}
           accumTokens={accumTokens}
+          busy={busy}
+          stopTurn={stopTurn}
         />
         <LogWindow logs={logs} />
       </SplitPane>
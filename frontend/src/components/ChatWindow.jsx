@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import Menu from './Menu';
 
-function ChatWindow({ messages, input, setInput, sendMessage, messagesEndRef, onClearHistory, agent, setAgent, agents, refreshAgents, deleteAgent, setDeleteAgent, handleDeleteAgent, lastTokensUsed, accumTokens }) {
+function ChatWindow({ messages, hasMore, fetchOlder, input, setInput, sendMessage, messagesEndRef, onClearHistory, agent, setAgent, agents, refreshAgents, deleteAgent, setDeleteAgent, handleDeleteAgent, lastTokensUsed, lastUsage, accumTokens, busy, stopTurn }) {
 	const [agentConfig, setAgentConfig] = useState({ description: '', servers: {} });
 	const [expandedServers, setExpandedServers] = useState({});
 
@@ -70,8 +70,13 @@ function ChatWindow({ messages, input, setInput, sendMessage, messagesEndRef, on
 			</div>
 			<div className="messages">
 				<div className="messages-scroll-area">
+					{hasMore && (
+						<button className="load-older-btn" onClick={fetchOlder}>
+							Load older messages
+						</button>
+					)}
 					{messages.map((msg, idx) => (
-						<div key={idx} className={msg.role === 'user' ? 'user-msg' : 'api-msg'}>
+						<div key={msg.id ?? `local-${idx}`} className={msg.role === 'user' ? 'user-msg' : 'api-msg'}>
 							<b>{msg.role}:</b> {msg.content}
 						</div>
 					))}
@@ -87,8 +92,20 @@ function ChatWindow({ messages, input, setInput, sendMessage, messagesEndRef, on
 					autoFocus
 				/>
 				<div className="send-btn-container">
-					<button type="submit">Send</button>
-					<div className="token-counter" title="Tokens used: (last request/total)">
+					{busy ? (
+						<button type="button" onClick={stopTurn}>Stop</button>
+					) : (
+						<button type="submit">Send</button>
+					)}
+					<div
+						className="token-counter"
+						title={
+							lastUsage
+								? `Tokens used: (last request/total)\nprompt ${lastUsage.prompt_tokens}, completion ${lastUsage.completion_tokens}\ntool schemas ~${lastUsage.tool_schema_tokens}, context ~${lastUsage.estimated_prompt_tokens}/${lastUsage.context_window}` +
+								  (lastUsage.timeline || []).map(s => `\n${s.start.toFixed(2)}s ${s.name}${s.target ? ` ${s.target}` : ''} ${(s.duration * 1000).toFixed(0)} ms`).join('')
+								: 'Tokens used: (last request/total)'
+						}
+					>
 						<span
 							className={
 								lastTokensUsed < 1500
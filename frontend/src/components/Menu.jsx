@@ -34,6 +34,7 @@ function Menu({
   const menuRef = useRef(null);
   const prevDeleteAgent = useRef("");
   const [menuOpen, setMenuOpen] = useState(false);
+  const [cacheStats, setCacheStats] = useState({});
 
   useEffect(() => {
     function handleClickOutside(event) {
@@ -55,6 +56,10 @@ function Menu({
       fetch(`/agent_config?agent=${encodeURIComponent(agent)}`)
         .then(res => res.json())
         .then(data => setAgentConfig(data));
+      fetch(`/tool_cache?agent=${encodeURIComponent(agent)}`)
+        .then(res => res.json())
+        .then(data => setCacheStats(data))
+        .catch(() => setCacheStats({}));
     }
   }, [menuOpen, agent, setAgentConfig]);
   const handleSelectAgent = async (name) => {
@@ -134,6 +139,28 @@ function Menu({
     });
   };
 
+  const handleFunctionCacheChange = async (serverName, functionName, cache) => {
+    setAgentConfig(prev => {
+      const updated = { ...prev };
+      updated.servers = { ...updated.servers };
+      if (updated.servers[serverName] && updated.servers[serverName].functions && updated.servers[serverName].functions[functionName]) {
+        updated.servers[serverName].functions = { ...updated.servers[serverName].functions };
+        updated.servers[serverName].functions[functionName] = { ...updated.servers[serverName].functions[functionName], cache };
+      }
+      return updated;
+    });
+    await fetch(`/agent_config/update_flag?agent=${encodeURIComponent(agent)}`, {
+      method: 'PATCH',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        server_name: serverName,
+        function_name: functionName,
+        flag_name: 'cache',
+        value: cache
+      }),
+    });
+  };
+
   return (
     <div className="menu-container" ref={menuRef}>
       <button className="menu-btn" onClick={async () => { await refreshAgents(); setMenuOpen(m => !m); }} title="Menu">&#8942;</button>
@@ -203,6 +230,19 @@ function Menu({
                               className="function-checkbox"
                             />
                             <span className="function-name" title={f.description || ''}>{fname}</span>
+                            <label className="function-cache" title="Cache results of this idempotent function">
+                              <input
+                                type="checkbox"
+                                checked={f.cache === true}
+                                onChange={e => handleFunctionCacheChange(serverName, fname, e.target.checked)}
+                              />
+                              cache
+                              {f.cache && cacheStats[serverName] && cacheStats[serverName][fname] && (
+                                <span className="function-cache-stats">
+                                  {` ${cacheStats[serverName][fname].hits}/${cacheStats[serverName][fname].hits + cacheStats[serverName][fname].misses}`}
+                                </span>
+                              )}
+                            </label>
                             <ThreePhaseIconButton
                               phase={f.confirmed || 'always_confirmed'}
                               onClick={async () => {
@@ -1,32 +1,49 @@
-import React from 'react';
+import React, { useState, useEffect } from 'react';
+
+const OPTIONS = [
+  { value: 'always_ask', label: 'Confirm' },
+  { value: 'always_confirmed', label: 'Always confirm' },
+  { value: 'always_rejected', label: 'Always Reject' },
+  { value: 'reject', label: 'Reject' },
+];
 
 function ToolCallModal({ toolCallPending, handleToolCallConfirm }) {
+  const [choices, setChoices] = useState([]);
+
+  useEffect(() => {
+    setChoices(toolCallPending ? toolCallPending.map(() => 'always_ask') : []);
+  }, [toolCallPending]);
+
   if (!toolCallPending) return null;
+
+  const setChoice = (idx, value) => setChoices(prev => prev.map((c, i) => (i === idx ? value : c)));
+
   return (
     <div className="modal-overlay">
       <div className="modal">
         <h3>Tool Call Permission</h3>
-        <p><b>Name:</b> {toolCallPending.name}</p>
-        <p><b>Description:</b> {toolCallPending.description}</p>
-        <div><b>Arguments:</b> <pre>{toolCallPending.args}</pre></div>
-        <div className="modal-confirm-label">
-          <label><b>Confirmation Option:</b></label>
-        </div>
-        <button onClick={() => handleToolCallConfirm('always_ask')}>
-          <span className="token-orange toolcall-icon">?</span>
-          Confirm
-        </button>
-        <button onClick={() => handleToolCallConfirm('always_confirmed')}>
+        {toolCallPending.map((call, idx) => (
+          <div key={idx} className="modal-tool-call">
+            <p><b>Name:</b> {call.name}</p>
+            <p><b>Description:</b> {call.description}</p>
+            <div><b>Arguments:</b> <pre>{call.args}</pre></div>
+            <div className="modal-confirm-label">
+              <label><b>Confirmation Option:</b></label>
+            </div>
+            <select value={choices[idx] || 'always_ask'} onChange={e => setChoice(idx, e.target.value)}>
+              {OPTIONS.map(opt => (
+                <option key={opt.value} value={opt.value}>{opt.label}</option>
+              ))}
+            </select>
+          </div>
+        ))}
+        <button onClick={() => handleToolCallConfirm(choices)}>
           <span className="token-green toolcall-icon">✔</span>
-          Always confirm
-        </button>
-        <button onClick={() => handleToolCallConfirm('always_rejected')}>
-          <span className="token-red toolcall-icon">✖</span>
-          Always Reject
+          Submit
         </button>
-        <button onClick={() => handleToolCallConfirm('reject')}>
+        <button onClick={() => handleToolCallConfirm(toolCallPending.map(() => 'reject'))}>
           <span className="token-red toolcall-icon">✖</span>
-          Reject
+          Reject all
         </button>
       </div>
     </div>
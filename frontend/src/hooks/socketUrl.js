@@ -0,0 +1,5 @@
+// Websocket URL of a backend path on the host that served the page, so it works behind the router and proxies
+export function socketUrl(path) {
+  const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+  return `${protocol}//${window.location.host}${path}`;
+}
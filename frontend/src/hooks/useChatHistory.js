@@ -1,20 +1,67 @@
-import { useState, useCallback } from 'react';
+import { useState, useCallback, useRef } from 'react';
+
+const PAGE_SIZE = 50;
+
+async function fetchPage(agent, params) {
+  const query = new URLSearchParams({ agent, ...params });
+  const response = await fetch(`/history?${query}`);
+  if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+  return response.json();
+}
 
 export function useChatHistory(agent) {
   const [messages, setMessages] = useState([]);
+  const [hasMore, setHasMore] = useState(false);
+  const oldestId = useRef(null);
+  const newestId = useRef(null);
 
+  // Load the most recent page when an agent is opened
   const fetchHistory = useCallback(async (selectedAgent = agent) => {
     try {
-      const response = await fetch(`/history?agent=${encodeURIComponent(selectedAgent)}`);
-      if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-      const data = await response.json();
+      const data = await fetchPage(selectedAgent, { limit: PAGE_SIZE });
       if (Array.isArray(data.messages)) {
         setMessages(data.messages);
+        setHasMore(Boolean(data.has_more));
+        oldestId.current = data.messages.length ? data.messages[0].id : null;
+        newestId.current = data.messages.length ? data.messages[data.messages.length - 1].id : null;
       }
     } catch (err) {
       setMessages([]);
+      setHasMore(false);
+    }
+  }, [agent]);
+
+  // Prepend the page before the oldest loaded message
+  const fetchOlder = useCallback(async () => {
+    if (oldestId.current === null) return;
+    try {
+      const data = await fetchPage(agent, { limit: PAGE_SIZE, before: oldestId.current });
+      if (Array.isArray(data.messages) && data.messages.length) {
+        setMessages(msgs => [...data.messages, ...msgs]);
+        oldestId.current = data.messages[0].id;
+      }
+      setHasMore(Boolean(data.has_more));
+    } catch (err) {
+      // keep what is shown
+    }
+  }, [agent]);
+
+  // Replace locally added messages by the messages the backend stored since the newest known one
+  const fetchNewer = useCallback(async () => {
+    try {
+      const params = newestId.current === null ? { limit: PAGE_SIZE } : { since: newestId.current };
+      const data = await fetchPage(agent, params);
+      if (Array.isArray(data.messages)) {
+        setMessages(msgs => [...msgs.filter(msg => msg.id !== undefined && msg.id !== null), ...data.messages]);
+        if (data.messages.length) {
+          newestId.current = data.messages[data.messages.length - 1].id;
+          if (oldestId.current === null) oldestId.current = data.messages[0].id;
+        }
+      }
+    } catch (err) {
+      // keep what is shown
     }
   }, [agent]);
 
-  return { messages, setMessages, fetchHistory };
+  return { messages, setMessages, fetchHistory, fetchOlder, fetchNewer, hasMore };
 }
@@ -1,24 +1,63 @@
 import { useEffect } from 'react';
 
-export function useChatWebSocketEffect(ws, agent, setMessages, setLastTokensUsed, setAccumTokens, setToolCallPending, setToolCallResolve) {
+function appendDelta(msgs, delta, index) {
+  const last = msgs[msgs.length - 1];
+  if (last && last.streaming && last.streamIndex === index) {
+    return [...msgs.slice(0, -1), { ...last, content: last.content + delta }];
+  }
+  return [...msgs, { role: 'assistant', content: delta, streaming: true, streamIndex: index }];
+}
+
+function updateToolCall(msgs, event, content) {
+  const idx = msgs.findIndex(msg => msg.toolCallId === event.id && msg.streaming);
+  const toolMsg = { role: 'tool', content, streaming: true, toolCallId: event.id };
+  if (idx === -1) return [...msgs, toolMsg];
+  return [...msgs.slice(0, idx), toolMsg, ...msgs.slice(idx + 1)];
+}
+
+export function useChatWebSocketEffect(ws, agent, setMessages, setLastTokensUsed, setAccumTokens, setToolCallPending, setToolCallResolve, onTurnFinished, setLastUsage, setBusy) {
   useEffect(() => {
     if (!ws.current) return;
     ws.current.onmessage = async (event) => {
       const data = JSON.parse(event.data);
+      if (typeof data.delta === 'string') {
+        setMessages(msgs => appendDelta(msgs, data.delta, data.index));
+      }
+      if (data.tool_call_started) {
+        setMessages(msgs => updateToolCall(msgs, data.tool_call_started, `calling ${data.tool_call_started.name}...`));
+      }
+      if (data.tool_call_finished) {
+        const status = data.tool_call_finished.rejected ? 'rejected' : 'finished';
+        setMessages(msgs => updateToolCall(msgs, data.tool_call_finished, `${data.tool_call_finished.name} ${status}`));
+      }
       if (Array.isArray(data.reply)) {
-        setMessages(msgs => [
-          ...msgs,
-          ...data.reply.map(msg => ({ role: 'assistant', content: msg })),
-        ]);
+        if (data.streamed) {
+          setMessages(msgs => msgs.map(msg => (msg.streaming ? { role: msg.role, content: msg.content } : msg)));
+        } else {
+          setMessages(msgs => [
+            ...msgs,
+            ...data.reply.map(msg => ({ role: 'assistant', content: msg })),
+          ]);
+        }
+        if (setBusy) setBusy(false);
+        if (data.cancelled) setToolCallPending(null);
+        if (data.usage && setLastUsage) setLastUsage({ ...data.usage, timeline: data.timeline });
+        // swap the locally built messages for the stored ones with ids
+        if (onTurnFinished) onTurnFinished();
       }
       if (typeof data.tokens_used === 'number') {
         setLastTokensUsed(data.tokens_used);
         setAccumTokens(accum => accum + data.tokens_used);
       }
-      if (data.tool_call_pending) {
-        setToolCallPending(data.tool_call_pending);
+      if (data.tool_calls_expired) {
+        // the backend stopped waiting and rejected the calls
+        setToolCallPending(null);
+        setToolCallResolve(null);
+      }
+      if (Array.isArray(data.tool_calls_pending)) {
+        setToolCallPending(data.tool_calls_pending);
         await new Promise((resolve) => setToolCallResolve(() => resolve));
       }
     };
-  }, [ws, agent, setMessages, setLastTokensUsed, setAccumTokens, setToolCallPending, setToolCallResolve]);
+  }, [ws, agent, setMessages, setLastTokensUsed, setAccumTokens, setToolCallPending, setToolCallResolve, onTurnFinished, setLastUsage, setBusy]);
 }
@@ -1,22 +1,31 @@
-import { useState, useCallback } from 'react';
+import { useState, useEffect } from 'react';
+import { socketUrl } from './socketUrl';
+
+// entries kept in the log window, older ones are discarded
+const MAX_LOGS = 1000;
 
 export function useLogs(agent) {
   const [logs, setLogs] = useState([]);
 
-  const fetchLogs = useCallback(async () => {
-    try {
-      const response = await fetch(`/logs?agent=${encodeURIComponent(agent)}`);
-      if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-      const data = await response.json();
-      setLogs(prevLogs =>
-        Array.isArray(data.logs)
-          ? [...prevLogs, ...data.logs]
-          : [...prevLogs, { level: 'ERROR', message: 'Backend logs not available', time: '' }]
-      );
-    } catch (err) {
-      setLogs([{ level: 'ERROR', message: `Error fetching logs: ${err.message}`, time: '' }]);
-    }
+  // The backend pushes buffered and new log records over a websocket, no polling needed
+  useEffect(() => {
+    setLogs([]);
+    const socket = new WebSocket(socketUrl(`/logs/ws?agent=${encodeURIComponent(agent)}`));
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (!Array.isArray(data.logs) || (data.logs.length === 0 && !data.dropped)) return;
+      setLogs(prevLogs => {
+        const dropped = data.dropped
+          ? [{ level: 'WARNING', message: `${data.dropped} log records dropped`, time: '' }]
+          : [];
+        return [...prevLogs, ...dropped, ...data.logs].slice(-MAX_LOGS);
+      });
+    };
+    socket.onerror = () => {
+      setLogs(prevLogs => [...prevLogs, { level: 'ERROR', message: 'Backend logs not available', time: '' }]);
+    };
+    return () => socket.close();
   }, [agent]);
 
-  return { logs, setLogs, fetchLogs };
+  return { logs, setLogs };
 }
@@ -1,10 +1,11 @@
 import { useRef, useEffect } from 'react';
+import { socketUrl } from './socketUrl';
 
 export function useToolCallWebSocket(agent, setMessages, setToolCallPending, setToolCallResolve) {
   const ws = useRef(null);
 
   useEffect(() => {
-    ws.current = new WebSocket(`ws://${window.location.hostname}:8000/chat`);
+    ws.current = new WebSocket(socketUrl('/chat'));
     ws.current.onopen = () => {};
     ws.current.onclose = () => {};
     ws.current.onerror = () => {};
@@ -16,8 +17,8 @@ export function useToolCallWebSocket(agent, setMessages, setToolCallPending, set
           ...data.reply.map(msg => ({ role: 'assistant', content: msg })),
         ]);
       }
-      if (data.tool_call_pending) {
-        setToolCallPending(data.tool_call_pending);
+      if (Array.isArray(data.tool_calls_pending)) {
+        setToolCallPending(data.tool_calls_pending);
         await new Promise((resolve) => setToolCallResolve(() => resolve));
       }
     };
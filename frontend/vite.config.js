@@ -5,8 +5,8 @@ export default defineConfig({
   plugins: [react()],
   server: {
     proxy: {
-      '/chat': 'http://localhost:8000',
-      '/logs': 'http://localhost:8000',
+      '/chat': { target: 'http://localhost:8000', ws: true },
+      '/logs': { target: 'http://localhost:8000', ws: true },
       '/clear_history': 'http://localhost:8000',
       '/history': 'http://localhost:8000',
       '/agents': 'http://localhost:8000',
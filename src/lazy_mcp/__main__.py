@@ -1,28 +1,89 @@
+import argparse
 import importlib.resources as pkg_resources
+import os
+import signal
+import socket
+import subprocess
+import sys
 import threading
 import webbrowser
 from pathlib import Path
+from typing import Any, Optional
 
 import uvicorn
-from fastapi.staticfiles import StaticFiles
 
-from lazy_mcp import api
+from lazy_mcp.config_utils import WORKERS
 
 
-def open_browser(port: int):
-    url = f"http://localhost:{port}"
-    threading.Timer(1.5, lambda: webbrowser.open(url)).start()
+class Server(uvicorn.Server):
+    """uvicorn server that opens the web interface in a browser as soon as it accepts connections."""
 
+    def __init__(self, config: uvicorn.Config, browser_url: Optional[str] = None) -> None:
+        """Initialize the server, opening browser_url once it is started if given."""
+        super().__init__(config)
+        self.browser_url: Optional[str] = browser_url
 
-def main(port=8000):
+    async def startup(self, sockets: Optional[list[socket.socket]] = None) -> None:
+        """Run the startup of the app and bind the sockets, then open the browser unless the startup failed."""
+        await super().startup(sockets=sockets)
+        if self.started and self.browser_url:
+            # webbrowser.open blocks until the browser was launched
+            threading.Thread(target=webbrowser.open, args=(self.browser_url,), daemon=True).start()
+
+
+def serve(app: Any, port: int, browser: bool) -> None:
+    """Serve an ASGI app on localhost, opening it in a browser once it is ready if browser is set."""
+    config = uvicorn.Config(app, host="127.0.0.1", port=port)
+    Server(config, browser_url=f"http://localhost:{port}" if browser else None).run()
+
+
+def run_workers(port: int, workers: int, browser: bool = True) -> None:
+    """
+    Start worker processes on the ports following port and route requests to the owners of their agents from port.
+    """
+    from lazy_mcp.routing import WorkerRouter
+
+    worker_ports = [port + 1 + index for index in range(workers)]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "lazy_mcp.api:app", "--host", "127.0.0.1", "--port", str(worker_port)],
+            env={**os.environ, "LAZY_MCP_WORKERS": str(workers), "LAZY_MCP_WORKER_INDEX": str(index)},
+        )
+        for index, worker_port in enumerate(worker_ports)
+    ]
+    # uvicorn re-raises the signal that stopped it, exit normally on SIGTERM so the workers are terminated below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        # the router completes its startup once the workers accept connections
+        serve(WorkerRouter([f"127.0.0.1:{worker_port}" for worker_port in worker_ports]), port, browser)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main(port=8000, workers=WORKERS):
     """
     Start FastAPI backend, mount static frontend files from src/lazy_mcp/static, and open browser.
+    With more than one worker, agents are spread over worker processes behind a routing proxy.
     """
+    parser = argparse.ArgumentParser(prog="lazy-mcp")
+    parser.add_argument("--port", type=int, default=port, help="port of the web interface")
+    parser.add_argument("--workers", type=int, default=workers, help="worker processes, each owning a share of agents")
+    parser.add_argument("--no-browser", action="store_false", dest="browser", help="do not open the web interface")
+    args = parser.parse_args()
+    if args.workers > 1:
+        run_workers(args.port, args.workers, args.browser)
+        return
+
+    from fastapi.staticfiles import StaticFiles
+
+    from lazy_mcp import api
 
     static_dir = Path(pkg_resources.files("lazy_mcp").joinpath("static"))
     api.app.mount("/", StaticFiles(directory=str(static_dir), html=True), name="frontend")
-    open_browser(port)
-    uvicorn.run(api.app, host="127.0.0.1", port=port)
+    serve(api.app, args.port, args.browser)
 
 
 if __name__ == "__main__":
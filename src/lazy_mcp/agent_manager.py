@@ -0,0 +1,236 @@
+"""
+agent_manager.py: Keeps a bounded set of agents (LLMClient) in memory.
+Agents are loaded on first access, concurrent first accesses sharing one load. Agents idle for longer than the TTL, or
+the least recently used ones beyond max_resident, are saved and dropped together with the MCP sessions only they used;
+the next access loads them again from the store. Turns of an agent run one after the other in arrival order, so
+several sockets driving the same agent do not interleave their history and config writes. The LLM and MCP clients are
+imported with the first agent, which keeps them out of the startup of the web server.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+
+from lazy_mcp.config_utils import AGENT_IDLE_TTL, AGENT_MAX_RESIDENT
+from lazy_mcp.mcp_pool import mcp_pool
+from lazy_mcp.models import AgentManagerStats, ResidentAgentStats
+
+if TYPE_CHECKING:
+    from lazy_mcp.llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+
+class ResidentAgent:
+    """A loaded agent with its usage bookkeeping."""
+
+    def __init__(self, llm: "LLMClient") -> None:
+        """Initialize the bookkeeping of a freshly loaded agent."""
+        self.llm: "LLMClient" = llm
+        self.in_use: int = 0
+        self.queued_turns: int = 0
+        self.last_used: float = time.monotonic()
+        self.turn_lock: asyncio.Lock = asyncio.Lock()
+        # the start of the MCP clients, awaited by all callers that asked for the agent meanwhile
+        self.loading: Optional[asyncio.Future] = None
+
+    @property
+    def evictable(self) -> bool:
+        """Whether the agent is neither used by a request or socket nor doing background work."""
+        return self.in_use == 0 and not self.turn_lock.locked() and not self.llm.busy
+
+
+class AgentManager:
+    """Loads agents on demand and evicts idle ones, with a cap on resident agents and LRU eviction."""
+
+    def __init__(self, max_resident: int = AGENT_MAX_RESIDENT, idle_ttl: float = AGENT_IDLE_TTL) -> None:
+        """Initialize an empty manager."""
+        self.max_resident: int = max_resident
+        self.idle_ttl: float = idle_ttl
+        self.agents: OrderedDict[str, ResidentAgent] = OrderedDict()
+        self.loads: int = 0
+        self.evictions: int = 0
+        self._loading: dict[str, ResidentAgent] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def get(self, agent: str) -> "LLMClient":
+        """Return the client of an agent, loading it if it is not resident."""
+        async with self._using(agent) as resident:
+            return resident.llm
+
+    async def _acquire(self, agent: str) -> ResidentAgent:
+        """Return the resident agent with a use registered, sharing a running load with concurrent callers.
+
+        The use is registered before the first await, so the eviction by a concurrent load cannot close the agent
+        between its load and the caller resuming. Callers release it with _release.
+        """
+        resident = self.agents.get(agent)
+        if resident is None:
+            resident = self._loading.get(agent)
+            if resident is None:
+                from lazy_mcp.llm_client import LLMClient
+
+                resident = ResidentAgent(LLMClient(agent))
+                resident.loading = asyncio.ensure_future(self._load(agent, resident))
+                self._loading[agent] = resident
+                resident.loading.add_done_callback(lambda _: self._loading.pop(agent, None))
+            resident.in_use += 1
+            try:
+                # a caller giving up must not abort the load for the others
+                await asyncio.shield(resident.loading)
+            except BaseException:
+                self._release(resident)
+                raise
+        else:
+            resident.in_use += 1
+        if agent in self.agents:
+            self.agents.move_to_end(agent)
+        resident.last_used = time.monotonic()
+        return resident
+
+    def _release(self, resident: ResidentAgent) -> None:
+        """Release a use of an agent registered by _acquire."""
+        resident.in_use -= 1
+        resident.last_used = time.monotonic()
+
+    async def _load(self, agent: str, resident: ResidentAgent) -> ResidentAgent:
+        """Start the MCP clients of an agent read from the store and make it resident."""
+        try:
+            await resident.llm.initialize_tools()
+        except BaseException:
+            await resident.llm.close()
+            raise
+        self.agents[agent] = resident
+        self.loads += 1
+        self._ensure_reaper()
+        await self._enforce_max_resident(keep=agent)
+        return resident
+
+    @asynccontextmanager
+    async def _using(self, agent: str) -> AsyncIterator[ResidentAgent]:
+        """Keep an agent from eviction while it is used, loading it if it is not resident."""
+        resident = await self._acquire(agent)
+        try:
+            yield resident
+        finally:
+            self._release(resident)
+
+    @asynccontextmanager
+    async def lease(self, agent: str) -> AsyncIterator["LLMClient"]:
+        """Use an agent beyond a single request, e.g. for a websocket. Leased agents are never evicted."""
+        async with self._using(agent) as resident:
+            yield resident.llm
+
+    @asynccontextmanager
+    async def turn(self, agent: str) -> AsyncIterator["LLMClient"]:
+        """Lease an agent for a chat turn, after the turns that other connections started before."""
+        async with self._using(agent) as resident:
+            resident.queued_turns += 1
+            try:
+                await resident.turn_lock.acquire()
+            finally:
+                resident.queued_turns -= 1
+            try:
+                yield resident.llm
+            finally:
+                resident.turn_lock.release()
+
+    async def _evict(self, agent: str) -> None:
+        """Save and drop an agent, closing MCP sessions no other agent uses."""
+        resident = self.agents.pop(agent, None)
+        if resident is None:
+            return
+        self.evictions += 1
+        logger.debug("Evicting agent '%s'", agent)
+        await resident.llm.save_agent_configuration()
+        await resident.llm.close()
+        await mcp_pool.release_unsubscribed()
+
+    def stop_saving(self, agent: str) -> None:
+        """Keep the resident client of an agent from saving it again, before its stored configuration is replaced.
+
+        Saves it queued before are written first, so store writes queued afterwards take effect.
+        """
+        resident = self.agents.get(agent)
+        if resident is not None:
+            resident.llm.discarded = True
+
+    async def discard(self, agent: str) -> None:
+        """Drop an agent without saving it, after its stored configuration was deleted or replaced.
+
+        A running turn of the agent ends without saving and the client is closed once it is over.
+        """
+        resident = self.agents.pop(agent, None)
+        if resident is not None:
+            resident.llm.discarded = True
+            async with resident.turn_lock:
+                await resident.llm.close()
+
+    async def _enforce_max_resident(self, keep: str) -> None:
+        """Evict the least recently used evictable agents except keep while more than max_resident are loaded."""
+        for agent in list(self.agents):
+            if len(self.agents) <= self.max_resident:
+                break
+            resident = self.agents.get(agent)
+            if agent != keep and resident is not None and resident.evictable:
+                await self._evict(agent)
+
+    async def evict_idle(self) -> None:
+        """Evict agents that have not been used for longer than the idle TTL."""
+        now = time.monotonic()
+        for agent, resident in list(self.agents.items()):
+            if resident.evictable and now - resident.last_used > self.idle_ttl:
+                await self._evict(agent)
+
+    def _ensure_reaper(self) -> None:
+        """Start the background task evicting idle agents."""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def _reap(self) -> None:
+        """Periodically evict idle agents."""
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_ttl / 2))
+            await self.evict_idle()
+
+    async def close_all(self) -> None:
+        """Save and drop all agents, stop the reaper and close the connections of the LLM clients, used on shutdown."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for agent in list(self.agents):
+            await self._evict(agent)
+        if self.loads:
+            from lazy_mcp.llm_client import close_shared_http_client
+
+            await close_shared_http_client()
+
+    def stats(self) -> AgentManagerStats:
+        """Return the resident agents with their usage and approximate memory."""
+        now = time.monotonic()
+        return AgentManagerStats(
+            resident=len(self.agents),
+            max_resident=self.max_resident,
+            idle_ttl=self.idle_ttl,
+            loads=self.loads,
+            evictions=self.evictions,
+            agents=[
+                ResidentAgentStats(
+                    agent=agent,
+                    in_use=resident.in_use,
+                    queued_turns=resident.queued_turns,
+                    idle_seconds=round(now - resident.last_used, 3),
+                    messages=len(resident.llm.agent_config.history),
+                    log_records=len(resident.llm.memory_handler.records),
+                    approx_bytes=len(resident.llm.agent_config.model_dump_json())
+                    + resident.llm.memory_handler.approx_bytes(),
+                )
+                for agent, resident in self.agents.items()
+            ],
+        )
+
+
+agent_manager = AgentManager()
@@ -0,0 +1,270 @@
+"""
+agent_store.py: Persistence of agent configurations and their conversation history.
+Defines the AgentStore interface and the default JSON backend, where the configuration is a small JSON document
+written atomically and the history an append-only JSON lines journal. Access to the files of an agent is serialized by
+a lock file, so several worker processes can share the config dir. Resident agents are written by one writer thread,
+which waits for the locks and the disk instead of the event loop.
+"""
+
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from lazy_mcp.config_utils import (
+    JOURNAL_COMPACT_SLACK,
+    LOCK_DIR,
+    STORE_BACKEND,
+    get_config_path,
+    get_history_path,
+    list_available_agents,
+)
+from lazy_mcp.models import AgentConfig, Message
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:  # pragma: no cover - POSIX
+    msvcrt = None
+
+# journal record marking that all previous messages were replaced by the following ones
+RESET_RECORD = '{"reset": true}'
+
+T = TypeVar("T")
+
+# a single thread keeps the writes in the order they were queued
+_store_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-store")
+
+
+async def run_in_store_writer(fn: Callable[..., T], *args: Any) -> T:
+    """Run a store write in the writer thread, after all writes queued before it."""
+    return await asyncio.get_running_loop().run_in_executor(_store_writer, fn, *args)
+
+
+def write_atomic(path: Path, data: str) -> None:
+    """Write data to a temporary file next to path and rename it over path."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _mtime(path: Path) -> Optional[int]:
+    """Return the modification time of a file in nanoseconds, None if it does not exist."""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def agent_lock(agent: str) -> Iterator[None]:
+    """Hold the inter-process lock of the files of an agent, blocking until other processes released it.
+
+    Every write of the JSON store holds the lock, creating the lock dir creates the config dir for it.
+    """
+    LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    with (LOCK_DIR / f"{agent}.lock").open("a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            # retries for about 10 seconds before raising OSError
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class AgentStore(ABC):
+    """Interface of the storage backends for agent configurations and history."""
+
+    @abstractmethod
+    def list_agents(self) -> list[str]:
+        """Return the names of all stored agents."""
+
+    @abstractmethod
+    def exists(self, agent: str) -> bool:
+        """Whether a configuration for the agent exists."""
+
+    @abstractmethod
+    def load(self, agent: str, with_history: bool = True) -> Optional[AgentConfig]:
+        """Load the configuration of an agent, None if the agent does not exist."""
+
+    @abstractmethod
+    def stores_history(self, agent: str) -> bool:
+        """Whether the history of the agent is stored separately from its configuration."""
+
+    @abstractmethod
+    def save_config(self, agent: str, agent_config: AgentConfig) -> None:
+        """Write the configuration of an agent without its history."""
+
+    @abstractmethod
+    def append_history(self, agent: str, messages: list[Message]) -> None:
+        """Append messages to the history of an agent."""
+
+    @abstractmethod
+    def rewrite_history(self, agent: str, messages: list[Message]) -> None:
+        """Replace the history of an agent."""
+
+    @abstractmethod
+    def delete(self, agent: str) -> None:
+        """Delete the configuration and history of an agent."""
+
+
+class JsonAgentStore(AgentStore):
+    """Stores each agent as a JSON configuration file and a JSON lines history journal in the config dir."""
+
+    def __init__(self) -> None:
+        """Initialize the store."""
+        self._journal_records: dict[str, int] = {}
+        # last written configuration of each agent with the modification time of the file after the write
+        self._saved_configs: dict[str, tuple[str, Optional[int]]] = {}
+
+    def list_agents(self) -> list[str]:
+        """Return the names of all agents with a configuration file."""
+        return list_available_agents()
+
+    def exists(self, agent: str) -> bool:
+        """Whether a configuration for the agent exists."""
+        return get_config_path(agent).exists()
+
+    def load(self, agent: str, with_history: bool = True) -> Optional[AgentConfig]:
+        """Load the configuration of an agent and replay its history journal, None if the agent does not exist."""
+        with agent_lock(agent):
+            return self._load(agent, with_history)
+
+    def _load(self, agent: str, with_history: bool) -> Optional[AgentConfig]:
+        """Load an agent while its lock is held."""
+        config_path = get_config_path(agent)
+        if not config_path.exists():
+            return None
+        with config_path.open("r") as f:
+            agent_config = AgentConfig(**json.load(f))
+        if with_history and get_history_path(agent).exists():
+            agent_config.history, torn = self._replay(agent)
+            if torn or self._journal_records[agent] > len(agent_config.history) + JOURNAL_COMPACT_SLACK:
+                self._compact(agent, agent_config.history)
+        return agent_config
+
+    def _replay(self, agent: str) -> tuple[list[Message], bool]:
+        """Read the history journal of an agent, also return whether a torn record was skipped."""
+        history: list[Message] = []
+        records = 0
+        torn = False
+        with get_history_path(agent).open("r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                records += 1
+                if line == RESET_RECORD:
+                    history = []
+                    continue
+                try:
+                    history.append(Message.model_validate_json(line))
+                except ValueError:
+                    # a torn record from an interrupted write
+                    torn = True
+        self._journal_records[agent] = records
+        return history, torn
+
+    def stores_history(self, agent: str) -> bool:
+        """Whether the history of the agent is stored in a journal."""
+        return get_history_path(agent).exists()
+
+    def save_config(self, agent: str, agent_config: AgentConfig) -> None:
+        """Atomically write the configuration of an agent without its history, skipped if nothing changed.
+
+        A file that was removed or rewritten by another process since the last write is always written.
+        """
+        data = agent_config.model_dump_json(indent=2, exclude={"history"})
+        path = get_config_path(agent)
+        with agent_lock(agent):
+            if self._saved_configs.get(agent) != (data, _mtime(path)):
+                write_atomic(path, data)
+                self._saved_configs[agent] = (data, _mtime(path))
+
+    def append_history(self, agent: str, messages: list[Message]) -> None:
+        """Append messages to the history journal of an agent."""
+        if not messages:
+            return
+        with agent_lock(agent), get_history_path(agent).open("a") as f:
+            f.write("".join(message.model_dump_json() + "\n" for message in messages))
+        self._journal_records[agent] = self._journal_records.get(agent, 0) + len(messages)
+
+    def rewrite_history(self, agent: str, messages: list[Message]) -> None:
+        """Replace the history of an agent, compacting the journal once it holds too many stale records."""
+        records = self._journal_records.get(agent, 0)
+        with agent_lock(agent):
+            if records > len(messages) + JOURNAL_COMPACT_SLACK:
+                self._compact(agent, messages)
+                return
+            with get_history_path(agent).open("a") as f:
+                f.write(RESET_RECORD + "\n")
+                f.write("".join(message.model_dump_json() + "\n" for message in messages))
+        self._journal_records[agent] = records + len(messages) + 1
+
+    def _compact(self, agent: str, messages: list[Message]) -> None:
+        """Rewrite the history journal while the lock of the agent is held."""
+        write_atomic(get_history_path(agent), "".join(message.model_dump_json() + "\n" for message in messages))
+        self._journal_records[agent] = len(messages)
+
+    def delete(self, agent: str) -> None:
+        """Delete the configuration and history journal of an agent."""
+        with agent_lock(agent):
+            for path in (get_config_path(agent), get_history_path(agent)):
+                if path.exists():
+                    path.unlink()
+        self._journal_records.pop(agent, None)
+        self._saved_configs.pop(agent, None)
+
+
+def create_agent_store(backend: str = STORE_BACKEND) -> AgentStore:
+    """Create the store for the configured backend, 'json' or 'sqlite'."""
+    if backend == "sqlite":
+        from lazy_mcp.sqlite_store import SqliteAgentStore
+
+        return SqliteAgentStore()
+    if backend != "json":
+        raise ValueError(f"Unknown agent store backend '{backend}'")
+    return JsonAgentStore()
+
+
+def migrate_json_to_sqlite() -> list[str]:
+    """Copy all agents stored as JSON files into the SQLite store and return their names."""
+    from lazy_mcp.sqlite_store import SqliteAgentStore
+
+    source = JsonAgentStore()
+    target = SqliteAgentStore()
+    migrated = []
+    for agent in source.list_agents():
+        agent_config = source.load(agent)
+        if agent_config is None:
+            continue
+        target.save_config(agent, agent_config)
+        target.rewrite_history(agent, agent_config.history or [])
+        migrated.append(agent)
+    return migrated
+
+
+agent_store = create_agent_store()
+
+
+if __name__ == "__main__":
+    for name in migrate_json_to_sqlite():
+        print(f"Migrated agent '{name}'")
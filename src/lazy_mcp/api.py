@@ -3,29 +3,81 @@ API endpoints for Lazy MCP backend using FastAPI.
 Provides chat and log retrieval endpoints, and initializes LLM tools on startup.
 """
 
+import asyncio
 import importlib.resources
-import shutil
-from typing import Any
+import logging
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Optional
 
 from fastapi import Body, FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
-from lazy_mcp.config_utils import SUMMARIZE_THRESHOLD, get_config_path, list_available_agents
-from lazy_mcp.llm_client import LLMClient
+from lazy_mcp import metrics
+from lazy_mcp.agent_manager import agent_manager
+from lazy_mcp.agent_store import agent_store, run_in_store_writer
+from lazy_mcp.chat_channel import ChatChannel
+from lazy_mcp.config_utils import LOG_PUSH_HEARTBEAT, get_blob_dir
+from lazy_mcp.llm_scheduler import llm_scheduler
+from lazy_mcp.mcp_pool import describe, mcp_pool, pool_key
 from lazy_mcp.models import (
     AgentConfig,
+    AgentManagerStats,
+    ChatResponse,
     ClearHistoryResponse,
     DeleteAgentResponse,
     HistoryMessage,
     HistoryResponse,
+    LLMSchedulerStats,
     LogEntry,
     LogsResponse,
+    MCPPoolStats,
+    ToolCacheStats,
+    ToolSchemaReport,
     UpdateFlagRequest,
     UpdateFlagResponse,
 )
-
-app = FastAPI()
+from lazy_mcp.routing import owns
+
+if TYPE_CHECKING:
+    from lazy_mcp.llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+
+async def preload_mcp_servers() -> None:
+    """Start the MCP servers flagged with preload in the configuration of any agent this worker owns."""
+    configs = {}
+    for agent in agent_store.list_agents():
+        if not owns(agent):
+            continue
+        try:
+            agent_config = agent_store.load(agent, with_history=False)
+        except Exception as e:
+            logger.error("Failed to read configuration of agent '%s': %s", agent, e)
+            continue
+        if agent_config is None:
+            continue
+        for server in agent_config.servers.values():
+            if server.preload:
+                configs[pool_key(server)] = server
+    results = await asyncio.gather(*(mcp_pool.preload(server) for server in configs.values()), return_exceptions=True)
+    for server, result in zip(configs.values(), results):
+        if isinstance(result, Exception):
+            logger.error("Failed to preload MCP server '%s': %s", describe(server), result)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan: preload MCP servers at boot, release pooled connections and sessions on exit."""
+    await preload_mcp_servers()
+    yield
+    await agent_manager.close_all()
+    await mcp_pool.close_all()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -34,15 +86,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global dictionary to hold all agent LLMClients
-agents: dict[str, LLMClient] = {}
+
+async def get_agent(agent: str) -> "LLMClient":
+    """Return the client of an agent, loaded on demand by the agent manager."""
+    return await agent_manager.get(agent)
 
 
-async def get_agent(agent: str) -> LLMClient:
-    if agent not in agents:
-        agents[agent] = LLMClient(agent)
-        await agents[agent].initialize_tools()
-    return agents[agent]
+async def chat_turn(channel: ChatChannel, agent: str, message: str, stream: bool, timeline: bool) -> ChatResponse:
+    """Run a chat turn once the turns other connections started on the agent are done, and save the agent."""
+    async with agent_manager.turn(agent) as llm:
+        try:
+            result = await llm.ask_llm_with_tools(message, channel, stream=stream, timeline=timeline)
+        finally:
+            await llm.save_agent_configuration()
+        llm.schedule_summarization()
+        return result
 
 
 # Endpoint to reset the default agent config
@@ -51,34 +109,42 @@ async def reset_default():
     """Reset the default agent configuration to its initial state."""
     try:
         default_json_path = importlib.resources.files("lazy_mcp.resources").joinpath("default.json")
-        user_config_path = get_config_path("default")
-        shutil.copy(default_json_path, user_config_path)
+        default_config = AgentConfig.model_validate_json(default_json_path.read_text())
+        agent_manager.stop_saving("default")
+        await run_in_store_writer(agent_store.delete, "default")
+        await run_in_store_writer(agent_store.save_config, "default", default_config)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to reset default agent: {e}")
 
     # Remove from memory and reload
-    if "default" in agents:
-        del agents["default"]
+    await agent_manager.discard("default")
     llm = await get_agent("default")
     return llm.agent_config
 
 
 @app.websocket("/chat")
 async def chat(websocket: WebSocket):
+    """Run chat turns. A message {"stop": true} cancels the running turn, as does closing the socket."""
     await websocket.accept()
+    channel = ChatChannel(websocket)
+    channel.start()
     try:
         while True:
-            data = await websocket.receive_json()
+            data = await channel.next_message()
             agent = data.get("agent", "default")
             message = data.get("message", "")
-            llm = await get_agent(agent)
-            result = await llm.ask_llm_with_tools(message, websocket)
-            if len(llm.agent_config.history) > SUMMARIZE_THRESHOLD:
-                llm.summarize_history()
-            llm.save_agent_configuration()
+            stream = data.get("stream", False)
+            timeline = data.get("timeline", False)
+            result = await channel.run_turn(chat_turn(channel, agent, message, stream, timeline))
+            if result is None:
+                if channel.closed:
+                    break
+                result = ChatResponse(reply=[], streamed=stream, cancelled=True)
             await websocket.send_json(result.dict())
     except WebSocketDisconnect:
         pass
+    finally:
+        await channel.close()
 
 
 @app.get("/logs", response_model=LogsResponse)
@@ -86,53 +152,80 @@ async def get_logs(agent: str = Query(..., description="Agent name/ID")) -> Logs
     """Logs endpoint: retrieve and format logs from the LLM client."""
     llm = await get_agent(agent)
     try:
-        log_entries: list[Any] = llm.get_and_clear_logs()
+        log_entries, dropped = llm.get_and_clear_logs()
         logs: list[LogEntry] = [LogEntry(**entry) if isinstance(entry, dict) else entry for entry in log_entries]
-        return LogsResponse(logs=logs)
+        return LogsResponse(logs=logs, dropped=dropped)
     except Exception as e:
         return LogsResponse(logs=[LogEntry(level="ERROR", message=f"Error fetching logs: {str(e)}", time="")])
 
 
+@app.websocket("/logs/ws")
+async def logs_websocket(websocket: WebSocket, agent: str = Query(..., description="Agent name/ID")):
+    """Push the buffered and all new log records of an agent, with the number of records missed in between."""
+    await websocket.accept()
+    seq = 0
+    # the agent stays resident while its logs are watched
+    async with agent_manager.lease(agent) as llm:
+        try:
+            while True:
+                entries, missed = await llm.memory_handler.wait_for_entries(seq, LOG_PUSH_HEARTBEAT)
+                if entries:
+                    seq = entries[-1]["seq"]
+                # an empty message doubles as heartbeat that notices closed connections
+                response = LogsResponse(logs=[LogEntry(**entry) for entry in entries], dropped=missed)
+                await websocket.send_json(response.model_dump())
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+
 @app.post("/clear_history", response_model=ClearHistoryResponse)
 async def clear_history(agent: str = Query(..., description="Agent name/ID")) -> ClearHistoryResponse:
-    """Endpoint to clear the conversation history."""
-    llm = await get_agent(agent)
-    try:
-        llm.clear_history()
-        llm.save_agent_configuration()
-        return ClearHistoryResponse(success=True)
-    except Exception:
-        return ClearHistoryResponse(success=False)
+    """Endpoint to clear the conversation history, after the running turn of the agent."""
+    async with agent_manager.turn(agent) as llm:
+        try:
+            llm.clear_history()
+            await llm.save_agent_configuration()
+            return ClearHistoryResponse(success=True)
+        except Exception:
+            return ClearHistoryResponse(success=False)
 
 
 @app.get("/history", response_model=HistoryResponse)
-async def get_history(agent: str = Query(..., description="Agent name/ID")) -> HistoryResponse:
-    """Endpoint to get the current conversation history."""
+async def get_history(
+    agent: str = Query(..., description="Agent name/ID"),
+    before: Optional[int] = Query(None, description="Only messages with an id smaller than this"),
+    since: Optional[int] = Query(None, description="Only messages with an id larger than this"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of messages"),
+) -> HistoryResponse:
+    """Endpoint to get a page of the conversation history.
+
+    Without parameters the whole history is returned. With before/limit pages go backwards from the newest message,
+    with since only messages added after a known message are returned.
+    """
     llm = await get_agent(agent)
-    messages = []
     assert llm.agent_config.history
-    for msg in llm.agent_config.history[1:]:  # Skip system message
-        if msg.content:
-            messages.append(HistoryMessage(role=msg.role, content=msg.content))
-    return HistoryResponse(messages=messages)
+    page, has_more = llm.history_page(before=before, limit=limit, since=since)
+    messages = [HistoryMessage(id=msg.id, role=msg.role, content=msg.content) for msg in page]
+    return HistoryResponse(messages=messages, has_more=has_more)
 
 
 @app.get("/agents", response_model=list[str])
 async def get_agents():
-    return list_available_agents()
+    return agent_store.list_agents()
 
 
 # Delete agent endpoint
 @app.delete("/agent", response_model=DeleteAgentResponse)
 async def delete_agent(agent: str = Query(..., description="Agent name/ID")) -> DeleteAgentResponse:
-    """Delete the agent config file and remove from memory."""
-    config_path = get_config_path(agent)
+    """Delete the agent config file, history journal and stored tool results and remove from memory."""
+    from lazy_mcp.tool_results import BlobStore
+
     try:
-        if config_path.exists():
-            config_path.unlink()
-        if agent in agents:
-            del agents[agent]
-        updated_agents = list_available_agents()
+        agent_manager.stop_saving(agent)
+        await run_in_store_writer(agent_store.delete, agent)
+        await agent_manager.discard(agent)
+        await run_in_store_writer(BlobStore(get_blob_dir(agent)).clear)
+        updated_agents = agent_store.list_agents()
         return DeleteAgentResponse(success=True, agents=updated_agents)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete agent: {e}")
@@ -145,6 +238,44 @@ async def get_agent_config(agent: str = Query(..., description="Agent name/ID"))
     return llm.agent_config
 
 
+@app.get("/agents/resident", response_model=AgentManagerStats)
+async def get_resident_agents() -> AgentManagerStats:
+    """Agents held in memory with their usage and approximate size."""
+    return agent_manager.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """Latency histograms and token and tool call counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/mcp_pool", response_model=MCPPoolStats)
+async def get_mcp_pool() -> MCPPoolStats:
+    """Occupancy, hit and spawn time statistics of the shared MCP session pool."""
+    return mcp_pool.stats()
+
+
+@app.get("/llm_scheduler", response_model=LLMSchedulerStats)
+async def get_llm_scheduler() -> LLMSchedulerStats:
+    """Queue depth, wait times, rate limit counters and remaining budgets of the shared completion scheduler."""
+    return llm_scheduler.stats()
+
+
+@app.get("/tool_cache", response_model=dict[str, dict[str, ToolCacheStats]])
+async def get_tool_cache(agent: str = Query(..., description="Agent name/ID")) -> dict[str, dict[str, ToolCacheStats]]:
+    """Hit and miss counters of the cached functions of an agent, by server and function name."""
+    llm = await get_agent(agent)
+    return llm.tool_cache_stats()
+
+
+@app.get("/tool_schema_report", response_model=list[ToolSchemaReport])
+async def get_tool_schema_report(agent: str = Query(..., description="Agent name/ID")) -> list[ToolSchemaReport]:
+    """Tokens of the tool schemas of every loaded server before and after compaction."""
+    llm = await get_agent(agent)
+    return [llm.schema_reports[name] for name in sorted(llm.schema_reports)]
+
+
 # Request model for updating a server or function flag
 
 
@@ -170,7 +301,8 @@ async def update_flag(
         else:
             # Update flag in server
             setattr(server, request.flag_name, request.value)
-        llm.save_agent_configuration()
+        llm.invalidate_tools()
+        await llm.save_agent_configuration()
         return UpdateFlagResponse(success=True)
     except Exception as e:
         return UpdateFlagResponse(success=False, detail=str(e))
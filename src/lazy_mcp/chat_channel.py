@@ -0,0 +1,103 @@
+"""
+chat_channel.py: Demultiplexes the messages of a chat websocket while a turn is running.
+A reader task owns the receiving side of the socket: chat messages are queued, tool call confirmations are handed to
+the turn waiting for them, and a stop message or a disconnect cancels the running turn, so its tool calls and
+completion do not keep running for a user who is gone.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional, TypeVar
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ChatChannel:
+    """Wraps a chat websocket, offering send_json and receive_json (for confirmations) to the LLM client."""
+
+    def __init__(self, websocket: WebSocket) -> None:
+        """Initialize the channel, start() begins reading."""
+        self.websocket: WebSocket = websocket
+        self.closed: bool = False
+        self._messages: asyncio.Queue[Optional[dict[str, Any]]] = asyncio.Queue()
+        self._confirmation: Optional[asyncio.Future] = None
+        self._turn: Optional[asyncio.Task] = None
+        self._stop_requested: bool = False
+        self._reader: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the reader task."""
+        self._reader = asyncio.create_task(self._read())
+
+    async def close(self) -> None:
+        """Stop the reader task and a running turn."""
+        if self._turn is not None:
+            self._turn.cancel()
+        if self._reader is not None:
+            self._reader.cancel()
+
+    async def _read(self) -> None:
+        """Dispatch incoming messages until the socket is closed."""
+        try:
+            while True:
+                data = await self.websocket.receive_json()
+                if data.get("stop"):
+                    if self._turn is not None and not self._turn.done():
+                        self._stop_requested = True
+                        self._turn.cancel()
+                elif "tool_calls_confirmed" in data:
+                    if self._confirmation is not None and not self._confirmation.done():
+                        self._confirmation.set_result(data)
+                    else:
+                        logger.debug("Dropping confirmation that arrived after its timeout")
+                else:
+                    self._messages.put_nowait(data)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self.closed = True
+            self._messages.put_nowait(None)
+            if self._confirmation is not None and not self._confirmation.done():
+                self._confirmation.set_exception(WebSocketDisconnect())
+            if self._turn is not None:
+                self._turn.cancel()
+
+    async def next_message(self) -> dict[str, Any]:
+        """Return the next chat message, raising WebSocketDisconnect once the socket is closed."""
+        data = await self._messages.get()
+        if data is None:
+            raise WebSocketDisconnect()
+        return data
+
+    async def send_json(self, data: Any) -> None:
+        """Send a message to the frontend."""
+        await self.websocket.send_json(data)
+
+    async def receive_json(self) -> dict[str, Any]:
+        """Wait for the confirmation of pending tool calls."""
+        if self.closed:
+            raise WebSocketDisconnect()
+        self._confirmation = asyncio.get_running_loop().create_future()
+        try:
+            return await self._confirmation
+        finally:
+            self._confirmation = None
+
+    async def run_turn(self, turn: Awaitable[T]) -> Optional[T]:
+        """Run a turn as a task that a stop message or disconnect can cancel. Returns None if it was cancelled."""
+        self._stop_requested = False
+        self._turn = asyncio.ensure_future(turn)
+        try:
+            await asyncio.wait({self._turn})
+        finally:
+            # the handler itself was cancelled, take the turn down with it
+            self._turn.cancel()
+        turn, self._turn = self._turn, None
+        if turn.cancelled():
+            logger.info("Turn %s", "stopped by the user" if self._stop_requested else "cancelled by disconnect")
+            return None
+        return turn.result()
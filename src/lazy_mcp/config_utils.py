@@ -1,12 +1,91 @@
+import os
 from pathlib import Path
 
 from platformdirs import user_config_dir
 
 APP_NAME = "lazy_mcp"
 DEFAULT_AGENT_NAME = "default"
-SUMMARIZE_THRESHOLD = 50
+# estimated history tokens above which the oldest turns are summarized
+SUMMARIZE_TOKEN_BUDGET = 16000
+# share of the budget kept verbatim as recent turns when summarizing
+SUMMARIZE_KEEP_RATIO = 0.5
+# context window of the deployment and the part of it reserved for the completion
+CONTEXT_WINDOW = int(os.getenv("AZURE_OPENAI_CONTEXT_WINDOW", "128000"))
+COMPLETION_RESERVE = 4096
+# longest tool or parameter description sent to the LLM, 0 keeps descriptions complete
+TOOL_DESCRIPTION_MAX_LENGTH = int(os.getenv("LAZY_MCP_TOOL_DESCRIPTION_MAX_LENGTH", "512"))
+MCP_POOL_MAX_LIVE = 16
+MCP_POOL_IDLE_TIMEOUT = 600.0
+# attempts to respawn a crashed MCP server and the delay before the first one, doubled after each failure
+MCP_RESTART_ATTEMPTS = 3
+MCP_RESTART_BACKOFF = 0.5
+# connections to remote (HTTP) MCP servers shared by all sessions, seconds an idle connection is kept alive, and the
+# timeouts of requests and of waiting for events on a server stream
+MCP_HTTP_MAX_CONNECTIONS = 64
+MCP_HTTP_KEEPALIVE_EXPIRY = 60.0
+MCP_HTTP_TIMEOUT = 30.0
+MCP_HTTP_READ_TIMEOUT = 300.0
+# worker processes of a multi-worker deployment and the index of this one, both set by the launcher
+WORKERS = max(1, int(os.getenv("LAZY_MCP_WORKERS", "1")))
+WORKER_INDEX = int(os.getenv("LAZY_MCP_WORKER_INDEX", "0"))
+# virtual nodes per worker on the hash ring assigning agents to workers
+HASH_RING_REPLICAS = 256
+# seconds the router waits for the workers to accept connections before it starts serving anyway
+WORKER_STARTUP_TIMEOUT = 60.0
+
+
+def _worker_share(quota: int) -> int:
+    """Return the part of a quota of the whole deployment that one worker may use, 0 stays unlimited."""
+    return max(1, quota // WORKERS) if quota > 0 else 0
+
+
+# request and token quota per minute of the deployment, shared by all agents and split between the workers, 0 for no
+# limit
+LLM_REQUESTS_PER_MINUTE = _worker_share(int(os.getenv("AZURE_OPENAI_RPM", "0")))
+LLM_TOKENS_PER_MINUTE = _worker_share(int(os.getenv("AZURE_OPENAI_TPM", "0")))
+# "record" or "replay" with LAZY_MCP_CASSETTE pointing to the cassette file, anything else disables cassettes
+CASSETTE_MODE = os.getenv("LAZY_MCP_CASSETTE_MODE", "")
+CASSETTE_PATH = os.getenv("LAZY_MCP_CASSETTE", "")
+# number of responses kept by the exact-match cache, 0 disables it
+RESPONSE_CACHE_SIZE = int(os.getenv("LAZY_MCP_RESPONSE_CACHE_SIZE", "0"))
+# retries of a rate limited or failed completion, the backoff before the first one if the response has no Retry-After,
+# and the random share added to every delay
+LLM_MAX_RETRIES = 4
+LLM_RETRY_BACKOFF = 1.0
+LLM_RETRY_JITTER = 0.25
+# seconds a tool call may take unless the server or function sets its own timeout
+TOOL_CALL_TIMEOUT = float(os.getenv("LAZY_MCP_TOOL_CALL_TIMEOUT", "120"))
+# seconds to wait for the user to confirm tool calls before they are rejected
+CONFIRMATION_TIMEOUT = float(os.getenv("LAZY_MCP_CONFIRMATION_TIMEOUT", "300"))
+# agents kept in memory, and seconds after which an idle agent is saved and dropped until it is used again
+AGENT_MAX_RESIDENT = int(os.getenv("LAZY_MCP_MAX_RESIDENT_AGENTS", "32"))
+AGENT_IDLE_TTL = float(os.getenv("LAZY_MCP_AGENT_IDLE_TTL", "1800"))
+JOURNAL_COMPACT_SLACK = 200
+# storage backend of agents, "json" or "sqlite"
+STORE_BACKEND = os.getenv("LAZY_MCP_STORE", "json")
+# created by the stores on their first write
 CONFIG_DIR = Path(user_config_dir(APP_NAME))
-CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+SQLITE_PATH = CONFIG_DIR / "agents.db"
+# milliseconds a write waits for the database lock held by another process
+SQLITE_BUSY_TIMEOUT_MS = 5000
+# lock files serializing access of several processes to the JSON files of an agent
+LOCK_DIR = CONFIG_DIR / "locks"
+# tool results longer than this are stored in the blob dir and only previewed in the history, 0 keeps them
+TOOL_RESULT_MAX_LENGTH = 8000
+TOOL_RESULT_PREVIEW_LENGTH = 2000
+TOOL_RESULT_PAGE_LENGTH = 4000
+BLOB_DIR = CONFIG_DIR / "blobs"
+# per agent, stored results unread for longer than the TTL in seconds are deleted, then the least recently read ones
+# beyond the size cap in bytes
+BLOB_TTL = float(os.getenv("LAZY_MCP_BLOB_TTL", "604800"))
+BLOB_MAX_BYTES = int(os.getenv("LAZY_MCP_BLOB_MAX_BYTES", "104857600"))
+# size of the shared cache of tool results and the default time to live of an entry in seconds
+TOOL_CACHE_MAX_ENTRIES = 512
+TOOL_CACHE_TTL = 300.0
+# log records kept per agent, longest logged argument, and seconds between heartbeats of the log websocket
+LOG_BUFFER_CAPACITY = 1000
+LOG_MESSAGE_MAX_LENGTH = 2000
+LOG_PUSH_HEARTBEAT = 30.0
 
 
 def get_config_path(agent: str) -> Path:
@@ -14,6 +93,16 @@ def get_config_path(agent: str) -> Path:
     return CONFIG_DIR / f"{agent}.json"
 
 
+def get_history_path(agent: str) -> Path:
+    """Return the history journal path for a given agent name."""
+    return CONFIG_DIR / f"{agent}.history.jsonl"
+
+
+def get_blob_dir(agent: str) -> Path:
+    """Return the directory of the stored tool results of a given agent name."""
+    return BLOB_DIR / agent
+
+
 def list_available_agents() -> list[str]:
     """Return a list of agent names (without .json extension) for all config files in the config dir."""
     return [p.stem for p in CONFIG_DIR.glob("*.json")]
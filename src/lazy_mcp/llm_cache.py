@@ -0,0 +1,107 @@
+"""
+llm_cache.py: Record/replay of completion responses and an exact-match response cache.
+Requests are keyed by a hash of model, messages, tools and whether they are streamed. In record mode every response is
+appended to a JSON lines cassette; in replay mode responses are served from the cassette without any network access,
+so the tool loop can be tested and benchmarked offline. Independently, a bounded in-memory LRU can answer repeated
+identical requests.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from lazy_mcp.config_utils import CASSETTE_MODE, CASSETTE_PATH, RESPONSE_CACHE_SIZE
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode for a request that is not on the cassette."""
+
+
+def request_key(request: dict[str, Any]) -> str:
+    """Hash the parts of a completion request that determine its response."""
+    keyed = {key: request.get(key) for key in ("model", "messages", "tools", "stream")}
+    return hashlib.sha256(json.dumps(keyed, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def _replay_stream(chunks: list[dict[str, Any]]) -> AsyncIterator[ChatCompletionChunk]:
+    """Yield recorded stream chunks."""
+    for chunk in chunks:
+        yield ChatCompletionChunk.model_validate(chunk)
+
+
+def _replay(record: dict[str, Any]) -> Any:
+    """Turn a recorded response back into the object the OpenAI client returns."""
+    if "chunks" in record:
+        return _replay_stream(record["chunks"])
+    return ChatCompletion.model_validate(record["response"])
+
+
+class CompletionRecorder:
+    """Wraps the completion call with a cassette and an exact-match response cache."""
+
+    def __init__(
+        self, mode: str = CASSETTE_MODE, path: str = CASSETTE_PATH, cache_size: int = RESPONSE_CACHE_SIZE
+    ) -> None:
+        """Initialize the recorder, loading the cassette in replay and record mode."""
+        self.mode: str = mode if mode in ("record", "replay") and path else ""
+        self.path: Optional[Path] = Path(path) if self.mode else None
+        self.cassette: dict[str, dict[str, Any]] = {}
+        self.cache: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self.cache_size: int = cache_size
+        self.cache_hits: int = 0
+        if self.path is not None and self.path.exists():
+            with self.path.open("r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.cassette[entry["key"]] = entry["record"]
+
+    @property
+    def replaying(self) -> bool:
+        """Whether responses are served from the cassette only."""
+        return self.mode == "replay"
+
+    async def create(self, create: Callable[..., Awaitable[Any]], **request: Any) -> Any:
+        """Return the response of a completion request, from the cassette or cache if possible, else from create."""
+        key = request_key(request)
+        if self.replaying:
+            if key not in self.cassette:
+                raise CassetteMissError(f"Request {key} is not on the cassette {self.path}")
+            return _replay(self.cassette[key])
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+            return _replay(self.cache[key])
+        response = await create(**request)
+        if self.mode != "record" and self.cache_size <= 0:
+            return response
+        if request.get("stream"):
+            return self._recording_stream(key, response)
+        self._store(key, {"response": response.model_dump(mode="json")})
+        return response
+
+    async def _recording_stream(self, key: str, response: Any) -> AsyncIterator[ChatCompletionChunk]:
+        """Pass the chunks of a streamed response through and store them once the stream completed."""
+        chunks = []
+        async for chunk in response:
+            chunks.append(chunk.model_dump(mode="json"))
+            yield chunk
+        self._store(key, {"chunks": chunks})
+
+    def _store(self, key: str, record: dict[str, Any]) -> None:
+        """Append a response to the cassette in record mode and put it into the response cache."""
+        if self.mode == "record" and self.path is not None and key not in self.cassette:
+            self.cassette[key] = record
+            with self.path.open("a") as f:
+                f.write(json.dumps({"key": key, "record": record}) + "\n")
+        if self.cache_size > 0:
+            self.cache[key] = record
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+
+completion_recorder = CompletionRecorder()
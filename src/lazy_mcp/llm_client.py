@@ -3,29 +3,56 @@ LLMClient: Handles interaction with Azure/OpenAI and MCP tool clients.
 Provides logging, tool initialization, and chat with tool support.
 """
 
+import asyncio
+import bisect
+import functools
 import inspect
 import json
 import logging
 import os
+import re
 from collections import defaultdict
 from pathlib import Path
 
 from dotenv import load_dotenv
-from openai import AzureOpenAI, BadRequestError
-
-from lazy_mcp.config_utils import DEFAULT_AGENT_NAME, get_config_path
+from openai import AsyncAzureOpenAI, BadRequestError, DefaultAsyncHttpxClient
+from pydantic import ValidationError
+
+from lazy_mcp.agent_store import agent_store, run_in_store_writer
+from lazy_mcp.config_utils import (
+    COMPLETION_RESERVE,
+    CONFIRMATION_TIMEOUT,
+    DEFAULT_AGENT_NAME,
+    SUMMARIZE_KEEP_RATIO,
+    TOOL_RESULT_MAX_LENGTH,
+    get_blob_dir,
+)
+from lazy_mcp.llm_cache import completion_recorder
+from lazy_mcp.llm_scheduler import Priority, llm_scheduler
 from lazy_mcp.mcp_client import LocalTool, MCPClient, MCPLocalClient
+from lazy_mcp.mcp_pool import mcp_pool
 from lazy_mcp.memory_log_handler import MemoryLogHandler
+from lazy_mcp.metrics import current_agent, span, start_timeline, stop_timeline, tokens_total, tool_calls_total
 from lazy_mcp.models import (
     AgentConfig,
+    ChatDelta,
     ChatResponse,
     ConfirmationState,
     ConfirmationStateResponse,
     MCPServerConfig,
     Message,
-    ToolCallConfirmation,
+    TokenUsage,
+    ToolCacheStats,
+    ToolCallEvent,
     ToolCallPending,
+    ToolCallsConfirmation,
+    ToolSchemaReport,
 )
+from lazy_mcp.tokens import estimate_history_tokens, estimate_text_tokens, estimate_tools_tokens
+from lazy_mcp.tool_cache import tool_cache
+from lazy_mcp.tool_results import BlobStore, read_page, result_text, spill
+from lazy_mcp.tool_retrieval import ToolRetriever
+from lazy_mcp.tool_schema import compact_tool
 
 logging.basicConfig(level=logging.WARNING)
 
@@ -33,6 +60,32 @@ logging.basicConfig(level=logging.WARNING)
 from typing import Any, Optional
 
 LOCAL_MCP_NAMES = ["local"]
+MAX_TOOL_NAME_LENGTH = 64
+
+# HTTP connection pool shared by the completion clients of all agents
+_shared_http_client: Optional[DefaultAsyncHttpxClient] = None
+
+
+def get_shared_http_client() -> DefaultAsyncHttpxClient:
+    """Return the process wide async HTTP client used for all LLM requests."""
+    global _shared_http_client
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        _shared_http_client = DefaultAsyncHttpxClient()
+    return _shared_http_client
+
+
+async def close_shared_http_client() -> None:
+    """Close the shared HTTP client and release its pooled connections."""
+    global _shared_http_client
+    if _shared_http_client is not None:
+        await _shared_http_client.aclose()
+        _shared_http_client = None
+
+
+def namespaced_tool_name(client_name: str, tool_name: str) -> str:
+    """Return a tool name prefixed with its server name, restricted to the characters allowed by the API."""
+    name = re.sub(r"[^a-zA-Z0-9_-]", "_", f"{client_name}__{tool_name}")
+    return name[-MAX_TOOL_NAME_LENGTH:]
 
 
 class LLMClient:
@@ -46,43 +99,159 @@ class LLMClient:
         self.azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT") or os.getenv("OPENAI_API_ENDPOINT")
         self.api_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT") or os.getenv("OPENAI_API_DEPLOYMENT")
         self.api_version = os.getenv(f"OPENAI_API_VERSION", "2023-07-01-preview")
-        self.client = AzureOpenAI(
+        if completion_recorder.replaying:
+            # replayed responses never reach the endpoint, placeholders let the client be built without credentials
+            self.api_key = self.api_key or "replay"
+            self.azure_endpoint = self.azure_endpoint or "https://replay.invalid"
+        self.client = AsyncAzureOpenAI(
             api_key=self.api_key,
             api_version=self.api_version,
             azure_endpoint=self.azure_endpoint,
+            http_client=get_shared_http_client(),
+            # retries are left to the shared scheduler, which backs off all agents together
+            max_retries=0,
         )
         self.mcp_clients = {}
         self.agent_name = agent_name
-        self.agent_config = AgentConfig(servers={})
-        config_path = get_config_path(self.agent_name)
-        if config_path.exists():
-            with config_path.open("r") as f:
-                self.agent_config = AgentConfig(**json.load(f))
-        elif get_config_path(DEFAULT_AGENT_NAME).exists():
-            with get_config_path(DEFAULT_AGENT_NAME).open("r") as f:
-                self.agent_config = AgentConfig(**json.load(f))
+        self.blob_store = BlobStore(get_blob_dir(agent_name))
+        self.agent_config = (
+            agent_store.load(self.agent_name) or agent_store.load(DEFAULT_AGENT_NAME) or AgentConfig(servers={})
+        )
+        # number of history messages already in the journal, and whether earlier ones were replaced since
+        if agent_store.exists(self.agent_name) and agent_store.stores_history(self.agent_name):
+            self._persisted_history = len(self.agent_config.history)
+        else:
+            self._persisted_history = 0
+        self._history_rewritten = False
+        # set once the stored agent was deleted or replaced, the client must not write it back
+        self.discarded: bool = False
         self.tools = defaultdict(list)
+        self.tool_index: dict[str, dict[str, Any]] = {}
+        self._tool_aliases: dict[str, dict[str, Any]] = {}
+        self._allowed_tools: Optional[list[dict[str, Any]]] = None
+        self._tools_tokens: int = 0
+        self._tool_retriever: Optional[ToolRetriever] = None
+        self.schema_reports: dict[str, ToolSchemaReport] = {}
+        self._background_tasks: set[asyncio.Task] = set()
+        # local tools change the agent itself and are executed one after the other
+        self._local_tool_calls: asyncio.Semaphore = asyncio.Semaphore(1)
+        self._summarizing: Optional[asyncio.Task] = None
         if not self.agent_config.history:
             self.clear_history()
+        elif any(message.id is None for message in self.agent_config.history):
+            # histories written before message ids existed get ids in order
+            for message in self.agent_config.history:
+                message.id = self.agent_config.next_message_id
+                self.agent_config.next_message_id += 1
+            self._history_rewritten = True
 
         self._init_local_tools()
 
     def clear_history(self) -> None:
-        """Clear the conversation history."""
-        self.agent_config.history = [Message(role="system", content=self.agent_config.description)]
-
-    def summarize_history(self) -> None:
-        """Summarize the conversation history to reduce token usage."""
-        combined_history = "\n".join(f"{msg.role}: {msg.content or ''}" for msg in self.agent_config.history[1:])
-        summary_prompt = f"Summarize the following conversation briefly, keep important details:\n\n{combined_history}"
-        response = self.client.chat.completions.create(
-            model=self.api_deployment,
-            messages=[Message(role="user", content=summary_prompt).model_dump()],
+        """Clear the conversation history and the tool results it stored."""
+        self.blob_store.clear()
+        self.agent_config.history = []
+        self._append_message(Message(role="system", content=self.agent_config.description))
+        self._history_rewritten = True
+
+    def _append_message(self, message: Message) -> None:
+        """Append a message to the history and assign it the next stable message id."""
+        message.id = self.agent_config.next_message_id
+        self.agent_config.next_message_id += 1
+        self.agent_config.history.append(message)
+
+    def _api_messages(self) -> list[dict[str, Any]]:
+        """Return the history as sent to the completion API."""
+        return [message.to_api() for message in self.agent_config.history]
+
+    def history_page(
+        self, before: Optional[int] = None, limit: Optional[int] = None, since: Optional[int] = None
+    ) -> tuple[list[Message], bool]:
+        """Return a page of displayable history messages (not the system message, not empty) and whether more exist.
+
+        With since, the oldest up to limit messages with a larger id are returned, otherwise the newest up to limit
+        messages with an id smaller than before.
+        """
+        history = self.agent_config.history[1:]
+        if since is not None:
+            start = bisect.bisect_right(history, since, key=lambda message: message.id)
+            page = [message for message in history[start:] if message.content]
+            if limit is not None and len(page) > limit:
+                return page[:limit], True
+            return page, False
+        end = len(history) if before is None else bisect.bisect_left(history, before, key=lambda message: message.id)
+        page = []
+        for index in range(end - 1, -1, -1):
+            if not history[index].content:
+                continue
+            if limit is not None and len(page) == limit:
+                return page[::-1], True
+            page.append(history[index])
+        return page[::-1], False
+
+    def schedule_summarization(self) -> None:
+        """Fold the oldest turns into the rolling summary in the background once the history exceeds the budget."""
+        if self._summarizing is not None and not self._summarizing.done():
+            return
+        if estimate_history_tokens(self.agent_config.history, self.api_deployment) <= self.agent_config.token_budget:
+            return
+        self._summarizing = asyncio.create_task(self.summarize_history())
+        self._background_tasks.add(self._summarizing)
+        self._summarizing.add_done_callback(self._background_tasks.discard)
+
+    def _summary_cut(self) -> int:
+        """Return the index of the first message kept verbatim, always the start of a user turn.
+
+        Cutting at user messages keeps assistant tool calls together with their tool results.
+        """
+        history = self.agent_config.history
+        keep = int(self.agent_config.token_budget * SUMMARIZE_KEEP_RATIO)
+        turn_starts = [i for i in range(2, len(history)) if history[i].role == "user" and not history[i].summary]
+        if not turn_starts:
+            return 1
+        tail = estimate_history_tokens(history[turn_starts[-1] :], self.api_deployment)
+        cut = turn_starts[-1]
+        for start, end in zip(reversed(turn_starts[:-1]), reversed(turn_starts)):
+            tail += estimate_history_tokens(history[start:end], self.api_deployment)
+            if tail > keep:
+                break
+            cut = start
+        return cut
+
+    async def summarize_history(self) -> None:
+        """Fold the oldest uncompressed turns and the previous rolling summary into a new rolling summary."""
+        history = self.agent_config.history
+        window = history[1 : self._summary_cut()]
+        if not window or (len(window) == 1 and window[0].summary):
+            return
+        combined_history = "\n".join(f"{msg.role}: {msg.content or ''}" for msg in window)
+        summary_prompt = (
+            "Summarize the following conversation briefly, keep important details. "
+            f"It may start with the summary of an even earlier part:\n\n{combined_history}"
         )
+        try:
+            with span("summarize"):
+                response = await self._create_completion(
+                    Priority.BACKGROUND,
+                    estimate_text_tokens(summary_prompt, self.api_deployment),
+                    messages=[Message(role="user", content=summary_prompt).to_api()],
+                )
+        except Exception as e:
+            self.logger.warning("Summarizing the conversation history failed: %s", e)
+            return
         summary = response.choices[0].message.content
-        self.clear_history()
-        self.agent_config.history.append(Message(role="user", content=summary))
-        self.logger.debug(f"Conversation history summarized. {summary}")
+        # the history may have been cleared or rewritten while waiting for the summary
+        history = self.agent_config.history
+        if len(history) <= len(window) or any(a is not b for a, b in zip(history[1 : len(window) + 1], window)):
+            self.logger.debug("History changed during summarization, summary discarded")
+            return
+        summary_message = Message(
+            role="user", content=f"Summary of the earlier conversation: {summary}", id=window[0].id, summary=True
+        )
+        history[1 : len(window) + 1] = [summary_message]
+        self._history_rewritten = True
+        await self.save_agent_configuration()
+        self.logger.debug("Summarized %s messages of the conversation history. %s", len(window), summary)
 
     def _init_local_tools(self) -> None:
         """Initialize local MCP client with built-in tools."""
@@ -167,22 +336,48 @@ class LLMClient:
                             },
                             "command": {
                                 "type": "string",
-                                "description": "Command to start the MCP server",
+                                "description": "Command to start the MCP server, for 'stdio'",
                             },
                             "arguments": {
                                 "type": "array",
                                 "items": {"type": "string"},
-                                "description": "List of arguments for the MCP server command",
+                                "description": "List of arguments for the MCP server command, for 'stdio'",
                             },
                             "communication_type": {
                                 "type": "string",
-                                "description": "Type of communication (e.g., 'stdio', 'socket', 'http')",
+                                "enum": ["stdio", "http", "sse"],
+                                "description": "'stdio' starts the command, 'http' (streamable HTTP) and 'sse' connect "
+                                "to a running server at url",
+                            },
+                            "url": {
+                                "type": "string",
+                                "description": "URL of a running MCP server, for 'http' and 'sse'",
                             },
                         },
-                        "required": ["mcp_name", "command", "arguments", "communication_type"],
+                        "required": ["mcp_name", "communication_type"],
                     },
                     function=bind_function(self.add_new_mcp_server),
                 ),
+                LocalTool(
+                    name="read_tool_result",
+                    type="function",
+                    description="Read a part of a tool result that was too long and was stored under a handle",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "handle": {
+                                "type": "string",
+                                "description": "Handle of the stored tool result",
+                            },
+                            "offset": {
+                                "type": "integer",
+                                "description": "Character offset to start reading at",
+                            },
+                        },
+                        "required": ["handle"],
+                    },
+                    function=bind_function(self.read_tool_result),
+                ),
             ],
         )
 
@@ -196,194 +391,608 @@ class LLMClient:
         self.memory_handler.setFormatter(formatter)
         self.logger.addHandler(self.memory_handler)
 
-    def change_agent_description(self, new_description: str) -> str:
+    def tool_cache_stats(self) -> dict[str, dict[str, ToolCacheStats]]:
+        """Return the tool cache counters of every cached function, by server and function name."""
+        return {
+            server_name: {
+                function_name: tool_cache.stats(server, function_name)
+                for function_name, function in (server.functions or {}).items()
+                if function.cache
+            }
+            for server_name, server in self.agent_config.servers.items()
+            if any(function.cache for function in (server.functions or {}).values())
+        }
+
+    def read_tool_result(self, handle: str, offset: int = 0) -> str:
+        """Return a page of a tool result stored in the blob store."""
+        return read_page(self.blob_store, handle, offset)
+
+    def _result_max_length(self, call: dict[str, Any]) -> int:
+        """Return the longest result of a tool call kept in the history, configured per function or per server."""
+        if call["function"] is not None and call["function"].max_result_length is not None:
+            return call["function"].max_result_length
+        server = self.agent_config.servers.get(call["client_name"])
+        if server is not None and server.max_result_length is not None:
+            return server.max_result_length
+        return TOOL_RESULT_MAX_LENGTH
+
+    async def change_agent_description(self, new_description: str) -> str:
         """Change the agent's system description."""
         self.agent_config.description = new_description
         assert len(self.agent_config.history) > 0
-        self.agent_config.history[0] = Message(role="system", content=new_description)
-        self.save_agent_configuration()
+        self.agent_config.history[0] = Message(
+            role="system", content=new_description, id=self.agent_config.history[0].id
+        )
+        self._history_rewritten = True
+        await self.save_agent_configuration()
         return "Agent description updated."
     
-    async def add_new_mcp_server(self, mcp_name: str, command: str, arguments: list[str], communication_type: str) -> None:
+    async def add_new_mcp_server(
+        self,
+        mcp_name: str,
+        communication_type: str,
+        command: str = "",
+        arguments: Optional[list[str]] = None,
+        url: Optional[str] = None,
+    ) -> None:
         """Add a new MCP server to the agent configuration. Replaces existing ones."""
         self.agent_config.servers[mcp_name] = MCPServerConfig(
             type=communication_type,
             command=command,
-            args=arguments
+            args=arguments or [],
+            url=url,
         )
-        self.save_agent_configuration()
+        await self.save_agent_configuration()
         return await self.load_mcp(mcp_name)
 
-    def save_agent_configuration(self):
-        """Save the current agent configuration to the configuration file."""
+    async def save_agent_configuration(self) -> None:
+        """Save the current agent configuration and append new history messages to the journal.
+
+        A copy is written by the store writer thread, queued after the previous saves.
+        """
+        if self.discarded:
+            return
+        history = self.agent_config.history
+        rewrite = self._history_rewritten or len(history) < self._persisted_history
+        messages = list(history) if rewrite else history[self._persisted_history :]
+        # the configuration may change while the writer thread serializes it
+        agent_config = self.agent_config.model_copy(update={"history": []}).model_copy(deep=True)
+        self._history_rewritten = False
+        self._persisted_history = len(history)
         try:
-            config_path = get_config_path(self.agent_name)
-            with config_path.open("w") as f:
-                f.write(self.agent_config.model_dump_json(indent=2))
+            with span("save"):
+                await run_in_store_writer(self._write_agent, agent_config, messages, rewrite)
+        except asyncio.CancelledError:
+            # the write may or may not have happened, the next save replaces the whole history
+            self._history_rewritten = True
+            raise
         except Exception as e:
-            self.logger.error(f"Failed to write agent_config: {e}")
+            self._history_rewritten = True
+            self.logger.error("Failed to write agent_config: %s", e)
+
+    def _write_agent(self, agent_config: AgentConfig, messages: list[Message], rewrite: bool) -> None:
+        """Write the configuration and the new or, with rewrite, all history messages of the agent to the store."""
+        agent_store.save_config(self.agent_name, agent_config)
+        if rewrite:
+            agent_store.rewrite_history(self.agent_name, messages)
+        else:
+            agent_store.append_history(self.agent_name, messages)
 
     def list_available_mcps(self) -> list[str]:
         """List all available MCP clients from config."""
-        self.logger.debug(f"Listing available MCP clients {list(self.agent_config.servers.keys())}")
+        self.logger.debug("Listing available MCP clients %s", list(self.agent_config.servers.keys()))
         return list(self.agent_config.servers.keys())
 
     async def load_mcp(self, mcp_name: str) -> Any:
         """Load an MCP client by name and initialize its tools."""
-        self.logger.debug(f"Loading MCP client '{mcp_name}'")
+        self.logger.debug("Loading MCP client '%s'", mcp_name)
         if mcp_name in self.agent_config.servers:
             try:
-                self.mcp_clients[mcp_name] = MCPClient(mcp_name, self.agent_config.servers[mcp_name])
-                ret = await self.initialize_tools()
-                self.save_agent_configuration()
+                if mcp_name in self.mcp_clients:
+                    await self.mcp_clients[mcp_name].close()
+                    # a reload is the explicit way to drop stale cached results of the server
+                    tool_cache.invalidate(self.agent_config.servers[mcp_name])
+                self.mcp_clients[mcp_name] = MCPClient(
+                    mcp_name, self.agent_config.servers[mcp_name], on_tools_changed=self._on_tools_changed
+                )
+                ret = await self.initialize_tools([mcp_name])
+                await self.save_agent_configuration()
                 return ret
             except Exception as e:
-                self.logger.error(f"Failed to load MCP client '{mcp_name}': {e}")
+                self.logger.error("Failed to load MCP client '%s': %s", mcp_name, e)
                 return {"error": str(e)}
         else:
             return {"error": f"MCP client '{mcp_name}' not found in configuration"}
 
-    def unload_mcp(self, mcp_name: str) -> Optional[str]:
+    async def unload_mcp(self, mcp_name: str) -> Optional[str]:
         """Unload an MCP client by name."""
         if mcp_name in self.mcp_clients:
-            del self.mcp_clients[mcp_name]
+            await self.mcp_clients.pop(mcp_name).close()
+            self.tools.pop(mcp_name, None)
+            self.schema_reports.pop(mcp_name, None)
+            self._build_tool_index()
             return None
         else:
             return str({"Error": f"MCP client '{mcp_name}' is not loaded"})
 
-    async def initialize_tools(self) -> None:
-        """Initialize and collect available tools from all loaded MCP clients."""
-        self.tools = defaultdict(list)
-        for client_name, mcp_client in self.mcp_clients.items():
-            tools = await mcp_client.list_tools()
-            for tool in tools.tools:
-                self.tools[client_name].append(
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": getattr(tool, "name", None),
-                            "description": getattr(tool, "description", None),
-                            "parameters": getattr(tool, "inputSchema"),
-                        },
-                    }
-                )
-            self.logger.debug(f"Initialized tools for MCP client '{client_name}': {self.tools[client_name]}")
+    @property
+    def busy(self) -> bool:
+        """Whether background work such as a summary is still running for the agent."""
+        return bool(self._background_tasks)
+
+    async def close(self) -> None:
+        """Detach all MCP clients of the agent, e.g. before the agent is removed from memory."""
+        for mcp_client in self.mcp_clients.values():
+            await mcp_client.close()
+        for task in self._background_tasks:
+            task.cancel()
+        # wait for them, a cancelled refresh must not reconnect a server after the agent is gone
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        # loggers are never released by the logging module, drop the per client logger explicitly
+        self.logger.removeHandler(self.memory_handler)
+        logging.Logger.manager.loggerDict.pop(self.logger.name, None)
+
+    async def initialize_tools(self, client_names: Optional[list[str]] = None) -> None:
+        """Initialize and collect available tools from loaded MCP clients.
+
+        Only the tools of the given clients are (re)listed. Without client_names all loaded clients are listed
+        concurrently.
+        """
+        current_agent.set(self.agent_name)
+        if client_names is None:
+            client_names = list(self.mcp_clients)
+            self.tools = defaultdict(list)
+        listed = await asyncio.gather(*(self._list_client_tools(client_name) for client_name in client_names))
+        for client_name, tools in zip(client_names, listed):
+            self.tools[client_name] = tools
+            self.logger.debug(
+                "Initialized tools for MCP client '%s': %s", client_name, [tool["function"]["name"] for tool in tools]
+            )
+        self._build_tool_index()
+
+    async def _list_client_tools(self, client_name: str) -> list[dict[str, Any]]:
+        """List the tools of a single MCP client as tool entries for the completion request."""
+        tools = await self.mcp_clients[client_name].list_tools()
+        raw_tools = [
+            {
+                "type": "function",
+                "function": {
+                    "name": getattr(tool, "name", None),
+                    "description": getattr(tool, "description", None),
+                    "parameters": getattr(tool, "inputSchema"),
+                },
+            }
+            for tool in tools.tools
+        ]
+        compact_tools = [compact_tool(tool) for tool in raw_tools]
+        raw_tokens = estimate_tools_tokens(raw_tools, self.api_deployment)
+        compact_tokens = estimate_tools_tokens(compact_tools, self.api_deployment)
+        self.schema_reports[client_name] = ToolSchemaReport(
+            server=client_name,
+            tools=len(compact_tools),
+            raw_tokens=raw_tokens,
+            compact_tokens=compact_tokens,
+            saved_tokens=raw_tokens - compact_tokens,
+        )
+        return compact_tools
+
+    def _on_tools_changed(self, client_name: str) -> None:
+        """Schedule a re-listing of a client's tools after its server announced a changed tool list."""
+        self.logger.debug("MCP client '%s' announced changed tools", client_name)
+        task = asyncio.create_task(self._refresh_client_tools(client_name))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _refresh_client_tools(self, client_name: str) -> None:
+        """Re-list the tools of a loaded client and persist changed function descriptions."""
+        if client_name not in self.mcp_clients:
+            return
+        try:
+            await self.initialize_tools([client_name])
+            await self.save_agent_configuration()
+        except Exception as e:
+            self.logger.error("Failed to refresh tools of MCP client '%s': %s", client_name, e)
+
+    def _build_tool_index(self) -> None:
+        """Rebuild the index from exposed tool names to their client, tool entry and function configuration.
+
+        Tool names offered by more than one MCP server are namespaced with the server name. The namespaced name of every
+        server tool stays resolvable, so calls keep working when a colliding server is unloaded.
+        """
+        counts: dict[str, int] = defaultdict(int)
+        for tools in self.tools.values():
+            for tool in tools:
+                counts[tool["function"]["name"]] += 1
+        self.tool_index = {}
+        self._tool_aliases = {}
+        for client_name, tools in self.tools.items():
+            server = self.agent_config.servers.get(client_name)
+            for tool in tools:
+                tool_name = tool["function"]["name"]
+                name = tool_name
+                if counts[tool_name] > 1 and client_name not in LOCAL_MCP_NAMES:
+                    name = namespaced_tool_name(client_name, tool_name)
+                    tool = {**tool, "function": {**tool["function"], "name": name}}
+                self.tool_index[name] = {
+                    "client_name": client_name,
+                    "tool_name": tool_name,
+                    "tool": tool,
+                    "function": server.functions.get(tool_name) if server and server.functions else None,
+                }
+                if client_name not in LOCAL_MCP_NAMES:
+                    self._tool_aliases[namespaced_tool_name(client_name, tool_name)] = self.tool_index[name]
+        self.invalidate_tools()
+
+    def invalidate_tools(self) -> None:
+        """Drop the cached list of allowed tools, e.g. after a server or function flag changed."""
+        self._allowed_tools = None
+        self._tool_retriever = None
 
     def _collect_allowed_tools(self) -> list[dict[str, Any]]:
-        """Collect all allowed tools from loaded MCP clients."""
-        tools_list = []
-        for client_name, tools in self.tools.items():
-            if client_name in LOCAL_MCP_NAMES:
-                for tool in tools:
-                    tools_list.append(tool)
-            else:
-                if client_name not in self.agent_config.servers or not self.agent_config.servers[client_name].allowed:
-                    continue
-                for tool in tools:
-                    assert "function" in tool
-                    assert "name" in tool["function"]
-                    tool_name = tool.get("function", {}).get("name")
-                    assert tool_name is not None or tool_name in self.agent_config.servers[client_name].functions
-                    if not tool_name or self.agent_config.servers[client_name].functions[tool_name].allowed:
-                        tools_list.append(tool)
-        return tools_list
-
-    async def ask_llm_with_tools(self, prompt: Optional[str] = None, websocket=None) -> ChatResponse:
-        """Send a prompt to the LLM, handle tool calls, and return responses. If websocket is provided, request frontend confirmation before tool call."""
-        self.agent_config.history.append(Message(role="user", content=prompt))
+        """Collect all allowed tools from loaded MCP clients.
+
+        The list is ordered by name, local tools first, so consecutive requests share a byte identical prefix that
+        provider side prompt caching can reuse.
+        """
+        if self._allowed_tools is None:
+            tools_list = []
+            for _, entry in sorted(
+                self.tool_index.items(), key=lambda item: (item[1]["client_name"] not in LOCAL_MCP_NAMES, item[0])
+            ):
+                client_name = entry["client_name"]
+                if client_name not in LOCAL_MCP_NAMES:
+                    server = self.agent_config.servers.get(client_name)
+                    if server is None or not server.allowed:
+                        continue
+                    if entry["function"] is not None and not entry["function"].allowed:
+                        continue
+                tools_list.append(entry["tool"])
+            self._allowed_tools = tools_list
+            self._tools_tokens = estimate_tools_tokens(tools_list, self.api_deployment)
+        return self._allowed_tools
+
+    def _select_tools(self, query: str, used: set[str]) -> list[dict[str, Any]]:
+        """Return the allowed tools ranked relevant to the query, together with the local tools and the tools used in
+        the current turn. All allowed tools are returned if subsetting is disabled or no tool matches the query.
+        """
         tools_list = self._collect_allowed_tools()
-
-        self.logger.warning(f"Using tools: {[tool['function']['name'] for tool in tools_list]}")
+        k = self.agent_config.tool_top_k
+        if k <= 0 or len(tools_list) <= k:
+            return tools_list
+        if self._tool_retriever is None:
+            self._tool_retriever = ToolRetriever(tools_list)
+        selected = set(self._tool_retriever.top_k(query, k))
+        if not selected:
+            return tools_list
+        selected |= used
+        selected |= {name for name, entry in self.tool_index.items() if entry["client_name"] in LOCAL_MCP_NAMES}
+        return [tool for tool in tools_list if tool["function"]["name"] in selected]
+
+    async def _fit_context(self, tools_tokens: int) -> int:
+        """Summarize and trim the history until it fits into the context window, return the estimated prompt tokens."""
+        limit = self.agent_config.context_window - COMPLETION_RESERVE - tools_tokens
+        if estimate_history_tokens(self.agent_config.history, self.api_deployment) > limit:
+            if self._summarizing is not None and not self._summarizing.done():
+                await self._summarizing
+            if estimate_history_tokens(self.agent_config.history, self.api_deployment) > limit:
+                await self.summarize_history()
+            self._drop_oldest_turns(limit)
+        return estimate_history_tokens(self.agent_config.history, self.api_deployment) + tools_tokens
+
+    def _drop_oldest_turns(self, limit: int) -> None:
+        """Drop whole turns after the system message and the rolling summary until the history fits into limit.
+
+        The turn of the latest user message is always kept.
+        """
+        history = self.agent_config.history
+        first = 2 if len(history) > 1 and history[1].summary else 1
+        turn_starts = [i for i in range(first, len(history)) if history[i].role == "user"]
+        if not turn_starts:
+            return
+        head = estimate_history_tokens(history[:first], self.api_deployment)
+        cut = turn_starts[-1]
+        for start in turn_starts:
+            if head + estimate_history_tokens(history[start:], self.api_deployment) <= limit:
+                cut = start
+                break
+        if cut > first:
+            self.logger.warning("Dropping %s messages to fit the context window", cut - first)
+            del history[first:cut]
+            self._history_rewritten = True
+
+    async def ask_llm_with_tools(
+        self, prompt: Optional[str] = None, websocket=None, stream: bool = False, timeline: bool = False
+    ) -> ChatResponse:
+        """Send a prompt to the LLM, handle tool calls, and return responses. If websocket is provided, request frontend confirmation before tool call.
+
+        If stream is set, completion deltas, tool call events and token usage are pushed to the websocket as they
+        arrive. If timeline is set, the spans of the turn are returned with the response.
+        """
+        current_agent.set(self.agent_name)
+        turn_timeline = start_timeline() if timeline else None
+        try:
+            response = await self._ask_llm_with_tools(prompt, websocket, stream)
+        finally:
+            if turn_timeline is not None:
+                stop_timeline()
+        if turn_timeline is not None:
+            response.timeline = turn_timeline.spans
+        return response
+
+    async def _ask_llm_with_tools(self, prompt: Optional[str], websocket, stream: bool) -> ChatResponse:
+        """Run the completion and tool call loop of a turn."""
+        self._append_message(Message(role="user", content=prompt))
+        stream = stream and websocket is not None
+        used_tools: set[str] = set()
+        tools_list = self._select_tools(prompt or "", used_tools)
+
+        self.logger.debug("Using tools: %s", [tool["function"]["name"] for tool in tools_list])
+        usage = TokenUsage(context_window=self.agent_config.context_window)
         tokens_used = 0
         try:
             ret: list[str] = []
             while True:
-                response = self.client.chat.completions.create(
-                    model=self.api_deployment,
-                    messages=self.agent_config.history,
-                    tools=tools_list,
-                    tool_choice="auto",
-                    parallel_tool_calls=False,
-                )
-                message = response.choices[0].message
-                self.agent_config.history.append(Message(**message.model_dump()))
+                if tools_list is self._allowed_tools:
+                    usage.tool_schema_tokens = self._tools_tokens
+                else:
+                    usage.tool_schema_tokens = estimate_tools_tokens(tools_list, self.api_deployment)
+                usage.estimated_prompt_tokens = await self._fit_context(usage.tool_schema_tokens)
+                with span("completion"):
+                    if stream:
+                        message, request_usage = await self._stream_completion(
+                            tools_list, websocket, len(ret), usage.estimated_prompt_tokens
+                        )
+                    else:
+                        message, request_usage = await self._completion(tools_list, usage.estimated_prompt_tokens)
+                tokens_total.inc(request_usage.prompt_tokens, agent=self.agent_name, kind="prompt")
+                tokens_total.inc(request_usage.completion_tokens, agent=self.agent_name, kind="completion")
+                self._append_message(message)
                 if message.content:
                     ret.append(message.content)
-                tokens_used += response.usage.total_tokens
-
-                if hasattr(message, "tool_calls") and message.tool_calls:
-                    await self._handle_tool_calls(message.tool_calls, websocket)
+                usage.prompt_tokens += request_usage.prompt_tokens
+                usage.completion_tokens += request_usage.completion_tokens
+                usage.total_tokens += request_usage.total_tokens
+                tokens_used = usage.total_tokens
+
+                if message.tool_calls:
+                    await self._handle_tool_calls(message.tool_calls, websocket, stream)
+                    # keep the tools of this turn available, tool calls may also have loaded new servers
+                    used_tools.update(call["function"]["name"] for call in message.tool_calls)
+                    tools_list = self._select_tools(prompt or "", used_tools)
                 else:
                     break
-            return ChatResponse(reply=ret, tokens_used=tokens_used)
+            return ChatResponse(reply=ret, tokens_used=tokens_used, streamed=stream, usage=usage)
         except BadRequestError as e:
-            self.logger.error(f"OpenAI content filter triggered: {e}")
-            self.clear_history()
-            return ChatResponse(reply = [f"Error: {str(e)}"], tokens_used=tokens_used)
-
-    async def _handle_tool_calls(self, tool_calls, websocket=None):
-        """Handle tool calls from LLM response."""
-        for tool_call in tool_calls:
-            tool_name = tool_call.function.name
-            tool_args = tool_call.function.arguments
-            tool_desc = None
-            for client_name, tools in self.tools.items():
-                for tool in tools:
-                    if tool["function"]["name"] == tool_name:
-                        tool_desc = tool["function"].get("description", "")
-                        mcp_client = self.mcp_clients[client_name]
-                        # Request confirmation from frontend
-                        if client_name in LOCAL_MCP_NAMES:
-                            confirmation_state = ConfirmationStateResponse.ALWAYS_CONFIRMED
-                        else:
-                            confirmation_state = self.agent_config.servers[client_name].functions[tool_name].confirmed
-                        if websocket is not None and confirmation_state == ConfirmationState.ALWAYS_ASK:
-                            payload = ToolCallPending(
-                                name=tool_name,
-                                args=tool_args,
-                                description=tool_desc,
-                            ).model_dump()
-                            await websocket.send_json({"tool_call_pending": payload})
-                            # Wait for confirmation and update state
-                            confirmation_state = ToolCallConfirmation(
-                                **await websocket.receive_json()
-                            ).tool_call_confirmed
-                            if confirmation_state == ConfirmationStateResponse.REJECT:
-                                confirmation_state_update = ConfirmationState.ALWAYS_ASK
-                            else:
-                                confirmation_state_update = confirmation_state
-                            if (
-                                confirmation_state_update
-                                != self.agent_config.servers[client_name].functions[tool_name].confirmed
-                            ):
-                                self.agent_config.servers[client_name].functions[
-                                    tool_name
-                                ].confirmed = confirmation_state_update
-                                self.save_agent_configuration()
-
-                        if confirmation_state not in (
-                            ConfirmationState.ALWAYS_REJECTED,
-                            ConfirmationStateResponse.REJECT,
-                        ):
-                            self.logger.info(f"Calling tool '{tool_name}' with args: {tool_args}")
-                            tool_result = await mcp_client.call_tool(tool_name, json.loads(tool_args))
-                            self.logger.info(f"Tool '{tool_name}' returned: {tool_result}")
-                            self.agent_config.history.append(
-                                Message(
-                                    role="tool",
-                                    tool_call_id=getattr(tool_call, "id", None),
-                                    content=str(tool_result),
-                                )
-                            )
-                        else:
-                            self.agent_config.history.append(
-                                Message(
-                                    role="tool",
-                                    tool_call_id=getattr(tool_call, "id", None),
-                                    content="rejected by user",
-                                )
-                            )
-
-    def get_and_clear_logs(self) -> list[dict[str, str]]:
-        """Return and clear all logs from the memory handler."""
+            if getattr(e, "code", None) == "context_length_exceeded":
+                # the local estimate was too low, keep the history but shrink it well below the limit
+                self.logger.error("Context window exceeded: %s", e)
+                self._drop_oldest_turns(self.agent_config.context_window // 2)
+            else:
+                self.logger.error("OpenAI content filter triggered: %s", e)
+                self.clear_history()
+            return ChatResponse(reply=[f"Error: {str(e)}"], tokens_used=tokens_used, streamed=stream, usage=usage)
+
+    async def _create_completion(self, priority: Priority, estimated_tokens: int, **request: Any) -> Any:
+        """Request a completion through the recorder; requests reaching the endpoint queue in the shared scheduler."""
+        scheduled = functools.partial(
+            llm_scheduler.create,
+            self.client.chat.completions.create,
+            agent=self.agent_name,
+            priority=priority,
+            estimated_tokens=estimated_tokens,
+        )
+        return await completion_recorder.create(scheduled, model=self.api_deployment, **request)
+
+    async def _completion(self, tools_list: list[dict[str, Any]], estimated_tokens: int) -> tuple[Message, TokenUsage]:
+        """Request a single completion and return the assistant message and the token usage."""
+        response = await self._create_completion(
+            Priority.INTERACTIVE,
+            estimated_tokens,
+            messages=self._api_messages(),
+            tools=tools_list,
+            tool_choice="auto",
+            parallel_tool_calls=True,
+        )
+        usage = TokenUsage(
+            prompt_tokens=response.usage.prompt_tokens,
+            completion_tokens=response.usage.completion_tokens,
+            total_tokens=response.usage.total_tokens,
+        )
+        return Message(**response.choices[0].message.model_dump()), usage
+
+    async def _stream_completion(
+        self, tools_list: list[dict[str, Any]], websocket, index: int, estimated_tokens: int
+    ) -> tuple[Message, TokenUsage]:
+        """Request a streamed completion, forward content deltas and reassemble the assistant message."""
+        response = await self._create_completion(
+            Priority.INTERACTIVE,
+            estimated_tokens,
+            messages=self._api_messages(),
+            tools=tools_list,
+            tool_choice="auto",
+            parallel_tool_calls=True,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        content: list[str] = []
+        tool_calls: dict[int, dict[str, Any]] = {}
+        usage = None
+        async for chunk in response:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                await websocket.send_json(ChatDelta(delta=delta.content, index=index).model_dump())
+            # tool call arguments arrive in fragments, keyed by the index of the call
+            for tool_call_delta in delta.tool_calls or []:
+                tool_call = tool_calls.setdefault(
+                    tool_call_delta.index,
+                    {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+                )
+                if tool_call_delta.id:
+                    tool_call["id"] = tool_call_delta.id
+                if tool_call_delta.function:
+                    tool_call["function"]["name"] += tool_call_delta.function.name or ""
+                    tool_call["function"]["arguments"] += tool_call_delta.function.arguments or ""
+        token_usage = TokenUsage()
+        if usage is not None:
+            token_usage = TokenUsage(
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                total_tokens=usage.total_tokens,
+            )
+            await websocket.send_json({"usage": token_usage.model_dump()})
+        message = Message(
+            role="assistant",
+            content="".join(content) or None,
+            tool_calls=[tool_calls[i] for i in sorted(tool_calls)] or None,
+        )
+        return message, token_usage
+
+    async def _handle_tool_calls(self, tool_calls: list[dict[str, Any]], websocket=None, stream: bool = False):
+        """Handle tool calls from LLM response.
+
+        Confirmations for all calls are requested in one websocket round trip, then the calls run concurrently with at
+        most max_in_flight calls per MCP server across all agents. Tool messages are appended in the order of the tool
+        calls.
+        If stream is set, tool call start and finish events are sent.
+        """
+        calls = [self._resolve_tool_call(tool_call) for tool_call in tool_calls]
+        try:
+            with span("confirmation"):
+                states = await self._confirm_tool_calls(calls, websocket)
+            results = await asyncio.gather(
+                *(self._run_tool_call(call, state, websocket, stream) for call, state in zip(calls, states))
+            )
+        except BaseException as e:
+            # every tool call needs an answer, or the history is rejected by the API
+            content = "cancelled by user" if isinstance(e, asyncio.CancelledError) else f"Error: {e}"
+            for call in calls:
+                self._append_message(Message(role="tool", tool_call_id=call["id"], content=content))
+            raise
+        for call, content in zip(calls, results):
+            self._append_message(Message(role="tool", tool_call_id=call["id"], content=content))
+
+    def _resolve_tool_call(self, tool_call: dict[str, Any]) -> dict[str, Any]:
+        """Find the MCP client, original tool name and description of the tool requested by a tool call."""
+        name = tool_call["function"]["name"]
+        entry = self.tool_index.get(name) or self._tool_aliases.get(name)
+        return {
+            "id": tool_call.get("id"),
+            "name": name,
+            "args": tool_call["function"]["arguments"],
+            "client_name": entry["client_name"] if entry else None,
+            "tool_name": entry["tool_name"] if entry else name,
+            "description": entry["tool"]["function"].get("description", "") if entry else None,
+            "function": entry["function"] if entry else None,
+        }
+
+    def _call_limiter(self, client_name: str) -> asyncio.Semaphore:
+        """Return the semaphore bounding the concurrent tool calls of the given MCP client."""
+        if client_name in LOCAL_MCP_NAMES:
+            return self._local_tool_calls
+        return mcp_pool.call_limiter(self.agent_config.servers[client_name])
+
+    @staticmethod
+    def _tool_known(call: dict[str, Any]) -> bool:
+        """Return whether a resolved tool call names a local tool or a configured function of a loaded server."""
+        return call["client_name"] in LOCAL_MCP_NAMES or (
+            call["client_name"] is not None and call["function"] is not None
+        )
+
+    async def _confirm_tool_calls(self, calls: list[dict[str, Any]], websocket=None) -> list[Any]:
+        """Return the confirmation state of each call, asking the frontend once for all calls that need it."""
+        states: list[Any] = []
+        for call in calls:
+            if call["client_name"] in LOCAL_MCP_NAMES:
+                states.append(ConfirmationStateResponse.ALWAYS_CONFIRMED)
+            elif self._tool_known(call):
+                states.append(call["function"].confirmed)
+            else:
+                # unknown tools are answered with "not found" without asking
+                states.append(None)
+        if websocket is None:
+            return states
+
+        ask = [i for i, state in enumerate(states) if state == ConfirmationState.ALWAYS_ASK]
+        if not ask:
+            return states
+        pending = [
+            ToolCallPending(name=calls[i]["name"], args=calls[i]["args"], description=calls[i]["description"])
+            for i in ask
+        ]
+        await websocket.send_json({"tool_calls_pending": [payload.model_dump() for payload in pending]})
+        # Wait for confirmation and update state, unanswered calls are rejected
+        try:
+            confirmation = await asyncio.wait_for(websocket.receive_json(), CONFIRMATION_TIMEOUT)
+            answers = ToolCallsConfirmation(**confirmation).tool_calls_confirmed
+        except asyncio.TimeoutError:
+            self.logger.warning("No confirmation within %s seconds, rejecting tool calls", CONFIRMATION_TIMEOUT)
+            await websocket.send_json({"tool_calls_expired": True})
+            answers = []
+        except (TypeError, ValidationError) as e:
+            self.logger.error("Invalid tool call confirmation, rejecting tool calls: %s", e)
+            answers = []
+        answers += [ConfirmationStateResponse.REJECT] * (len(ask) - len(answers))
+        changed = False
+        for i, confirmation_state in zip(ask, answers):
+            states[i] = confirmation_state
+            if confirmation_state == ConfirmationStateResponse.REJECT:
+                confirmation_state_update = ConfirmationState.ALWAYS_ASK
+            else:
+                confirmation_state_update = confirmation_state
+            function = calls[i]["function"]
+            if confirmation_state_update != function.confirmed:
+                function.confirmed = confirmation_state_update
+                changed = True
+        if changed:
+            await self.save_agent_configuration()
+        return states
+
+    async def _run_tool_call(
+        self,
+        call: dict[str, Any],
+        confirmation_state: Any,
+        websocket=None,
+        stream: bool = False,
+    ) -> str:
+        """Execute a single confirmed tool call and return the content of its tool message."""
+        tool_name = call["name"]
+        if not self._tool_known(call):
+            self.logger.error("Tool '%s' not found", tool_name)
+            return f"Error: tool '{tool_name}' not found"
+        rejected = confirmation_state in (ConfirmationState.ALWAYS_REJECTED, ConfirmationStateResponse.REJECT)
+        if rejected:
+            content = "rejected by user"
+            tool_calls_total.inc(agent=self.agent_name, tool=tool_name, outcome="rejected")
+        else:
+            async with self._call_limiter(call["client_name"]):
+                self.logger.info("Calling tool '%s' with args: %s", tool_name, call["args"])
+                if stream:
+                    event = ToolCallEvent(id=call["id"], name=tool_name, args=call["args"])
+                    await websocket.send_json({"tool_call_started": event.model_dump()})
+                try:
+                    mcp_client = self.mcp_clients[call["client_name"]]
+                    with span("call_tool", tool_name):
+                        tool_result = await mcp_client.call_tool(call["tool_name"], json.loads(call["args"] or "{}"))
+                except Exception as e:
+                    # also malformed arguments and failing local tools get an answer, the other calls keep theirs
+                    outcome = "timeout" if isinstance(e, TimeoutError) else "error"
+                    content = f"Error: {e}"
+                    self.logger.error("Tool '%s' failed: %s", tool_name, e)
+                else:
+                    outcome = "error" if getattr(tool_result, "isError", False) else "ok"
+                    content = spill(result_text(tool_result), self._result_max_length(call), self.blob_store)
+                    self.logger.info("Tool '%s' returned: %s", tool_name, content)
+            tool_calls_total.inc(agent=self.agent_name, tool=tool_name, outcome=outcome)
+        if stream:
+            event = ToolCallEvent(id=call["id"], name=tool_name, args=call["args"], rejected=rejected)
+            await websocket.send_json({"tool_call_finished": event.model_dump()})
+        return content
+
+    def get_and_clear_logs(self) -> tuple[list[dict[str, Any]], int]:
+        """Return the logs not fetched before and how many of them the memory handler already dropped."""
         return self.memory_handler.get_and_clear_logs()
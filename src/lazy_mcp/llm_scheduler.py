@@ -0,0 +1,288 @@
+"""
+llm_scheduler.py: Process wide scheduler in front of the completion calls of all agents.
+Requests are admitted within a request-per-minute and a token-per-minute budget of the shared deployment. Waiting
+requests are admitted by priority (interactive turns before background summaries) and round robin across agents within
+a priority, so one busy agent cannot starve the others. A 429 pauses all admissions for its Retry-After, or an
+exponential backoff, plus jitter before the request is retried.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from lazy_mcp.config_utils import (
+    LLM_MAX_RETRIES,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_RETRY_BACKOFF,
+    LLM_RETRY_JITTER,
+    LLM_TOKENS_PER_MINUTE,
+)
+from lazy_mcp.metrics import record_span
+from lazy_mcp.models import LLMSchedulerStats
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Admission order of requests, lower values first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class TokenBucket:
+    """Budget refilled continuously by per_minute every minute, unlimited for per_minute 0."""
+
+    def __init__(self, per_minute: int) -> None:
+        """Initialize a full bucket."""
+        self.per_minute: int = per_minute
+        self.level: float = float(per_minute)
+        self.updated: float = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """Add the budget accrued since the last update."""
+        self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def available(self, now: float) -> float:
+        """Return the current budget."""
+        if self.per_minute > 0:
+            self._refill(now)
+        return self.level
+
+    def delay(self, amount: float, now: float) -> float:
+        """Return the seconds until amount is available. Amounts beyond the capacity wait for a full bucket."""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        return max(0.0, (min(amount, self.per_minute) - self.level) * 60 / self.per_minute)
+
+    def take(self, amount: float, now: float) -> None:
+        """Spend amount, or give it back for a negative amount. The level may drop below zero."""
+        if self.per_minute <= 0:
+            return
+        self._refill(now)
+        self.level = min(self.per_minute, self.level - min(amount, self.per_minute))
+
+
+class _Waiter:
+    """A request waiting for admission."""
+
+    def __init__(self, agent: str, priority: Priority, tokens: int) -> None:
+        self.agent: str = agent
+        self.priority: Priority = priority
+        self.tokens: int = tokens
+        self.enqueued: float = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Return the delay requested by the Retry-After headers of a rate limit response, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value is None:
+            continue
+        try:
+            return float(value) * scale
+        except ValueError:
+            # an HTTP date, fall back to the backoff
+            return None
+    return None
+
+
+class LLMScheduler:
+    """Priority and fair queuing of completion requests with rate limit aware backpressure."""
+
+    def __init__(
+        self,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff: float = LLM_RETRY_BACKOFF,
+        jitter: float = LLM_RETRY_JITTER,
+    ) -> None:
+        """Initialize the scheduler with full budgets and empty queues."""
+        self.requests: TokenBucket = TokenBucket(requests_per_minute)
+        self.tokens: TokenBucket = TokenBucket(tokens_per_minute)
+        self.max_retries: int = max_retries
+        self.backoff: float = backoff
+        self.jitter: float = jitter
+        # waiters by priority, then by agent in round robin order
+        self.queues: dict[Priority, OrderedDict[str, deque[_Waiter]]] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self.paused_until: float = 0.0
+        self.admitted: int = 0
+        self.rate_limited: int = 0
+        self.retried: int = 0
+        self.wait_total: float = 0.0
+        self.wait_max: float = 0.0
+        self._wake: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _delay(self, tokens: int, now: float) -> float:
+        """Return the seconds until a request of tokens may be admitted."""
+        return max(self.paused_until - now, self.requests.delay(1, now), self.tokens.delay(tokens, now))
+
+    def _admit(self, tokens: int, enqueued: float, now: float) -> None:
+        """Spend the budget of a request and record its wait."""
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self.admitted += 1
+        waited = now - enqueued
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def _next(self) -> Optional[_Waiter]:
+        """Return the waiter to admit next: the first agent in round robin order of the highest priority."""
+        for priority in Priority:
+            queue = self.queues[priority]
+            if queue:
+                return next(iter(queue.values()))[0]
+        return None
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """Take a waiter out of its queue, moving its agent to the end of the round robin order."""
+        queue = self.queues[waiter.priority]
+        waiters = queue.pop(waiter.agent, None)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if waiters:
+            queue[waiter.agent] = waiters
+
+    def _ensure_dispatcher(self) -> None:
+        """Start the task admitting queued requests."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wake = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        assert self._wake is not None
+        self._wake.set()
+
+    async def _dispatch(self) -> None:
+        """Admit queued requests as the budgets allow, sleeping until they refill or a request arrives."""
+        assert self._wake is not None
+        while True:
+            waiter = self._next()
+            delay = None
+            if waiter is not None:
+                now = time.monotonic()
+                delay = self._delay(waiter.tokens, now)
+                if delay <= 0:
+                    self._remove(waiter)
+                    if not waiter.future.done():
+                        self._admit(waiter.tokens, waiter.enqueued, now)
+                        waiter.future.set_result(None)
+                    continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def acquire(self, agent: str, priority: Priority, tokens: int) -> None:
+        """Wait until a request of an agent with an estimated number of tokens is admitted."""
+        now = time.monotonic()
+        if not any(self.queues.values()) and self._delay(tokens, now) <= 0:
+            self._admit(tokens, now, now)
+            record_span("llm_queue", now, 0.0)
+            return
+        waiter = _Waiter(agent, priority, tokens)
+        self.queues[priority].setdefault(agent, deque()).append(waiter)
+        self._ensure_dispatcher()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self._remove(waiter)
+            raise
+        record_span("llm_queue", waiter.enqueued, time.monotonic() - waiter.enqueued)
+
+    async def create(
+        self,
+        create: Callable[..., Awaitable[Any]],
+        *,
+        agent: str,
+        priority: Priority = Priority.INTERACTIVE,
+        estimated_tokens: int = 0,
+        **request: Any,
+    ) -> Any:
+        """Call create with the request once admitted, retrying rate limited and failed attempts with backoff.
+
+        The token budget is corrected by the usage the response reports, for streams once they are consumed.
+        """
+        from openai import APIConnectionError, InternalServerError, RateLimitError
+
+        attempt = 0
+        while True:
+            await self.acquire(agent, priority, estimated_tokens)
+            try:
+                response = await create(**request)
+            except (RateLimitError, InternalServerError, APIConnectionError) as e:
+                # the refused request did not use its tokens
+                self.tokens.take(-estimated_tokens, time.monotonic())
+                if isinstance(e, RateLimitError):
+                    self.rate_limited += 1
+                if attempt == self.max_retries:
+                    raise
+                self.retried += 1
+                delay = self.backoff * 2**attempt
+                attempt += 1
+                if isinstance(e, RateLimitError):
+                    delay = retry_after(e) or delay
+                delay *= 1 + random.uniform(0, self.jitter)
+                logger.warning("Completion of agent '%s' failed (%s), retrying in %.1f seconds", agent, e, delay)
+                if isinstance(e, RateLimitError):
+                    # the quota is shared, hold back every agent
+                    self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            if request.get("stream"):
+                return self._settling_stream(response, estimated_tokens)
+            self._settle(estimated_tokens, getattr(response, "usage", None))
+            return response
+
+    def _settle(self, estimated_tokens: int, usage: Any) -> None:
+        """Charge the difference between the reported and the estimated tokens of a request."""
+        if usage is not None:
+            self.tokens.take(usage.total_tokens - estimated_tokens, time.monotonic())
+
+    async def _settling_stream(self, response: Any, estimated_tokens: int) -> AsyncIterator[Any]:
+        """Pass the chunks of a streamed response through and settle its usage once it completed."""
+        usage = None
+        async for chunk in response:
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        self._settle(estimated_tokens, usage)
+
+    def stats(self) -> LLMSchedulerStats:
+        """Return queue depths, admission counters, wait times and the remaining budgets."""
+        now = time.monotonic()
+        queued_by_agent: dict[str, int] = {}
+        for queue in self.queues.values():
+            for agent, waiters in queue.items():
+                queued_by_agent[agent] = queued_by_agent.get(agent, 0) + len(waiters)
+        return LLMSchedulerStats(
+            queued={priority.name.lower(): sum(map(len, self.queues[priority].values())) for priority in Priority},
+            queued_by_agent=queued_by_agent,
+            admitted=self.admitted,
+            rate_limited=self.rate_limited,
+            retried=self.retried,
+            wait_seconds_total=round(self.wait_total, 3),
+            wait_seconds_max=round(self.wait_max, 3),
+            paused_seconds=round(max(0.0, self.paused_until - now), 3),
+            requests_per_minute=self.requests.per_minute,
+            tokens_per_minute=self.tokens.per_minute,
+            request_budget=round(self.requests.available(now), 1),
+            token_budget=round(self.tokens.available(now), 1),
+        )
+
+
+llm_scheduler = LLMScheduler()
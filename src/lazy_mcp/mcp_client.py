@@ -3,13 +3,23 @@ mcp_client.py: Defines MCPClient and MCPLocalClient for managing tool servers an
 Provides classes for tool listing and invocation.
 """
 
-from contextlib import AsyncExitStack
-from typing import Any, Callable
+import asyncio
+from typing import Any, Callable, Optional
 
+import anyio
 from mcp import ClientSession
-from mcp.client.stdio import StdioServerParameters, stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED, Tool, ToolListChangedNotification
 
+from lazy_mcp.config_utils import MCP_RESTART_ATTEMPTS, TOOL_CALL_TIMEOUT
+from lazy_mcp.mcp_pool import mcp_pool
+from lazy_mcp.metrics import span
 from lazy_mcp.models import Function, MCPServerConfig
+from lazy_mcp.tool_cache import tool_cache
+
+# error code of the streamable HTTP transport for a request the server rejected because it does not know the session,
+# e.g. after the server restarted
+SESSION_TERMINATED = 32600
 
 
 class LocalTool:
@@ -32,53 +42,91 @@ class LocalTool:
 
 
 class ListToolsResult:
-    """Result wrapper for a list of LocalTool objects."""
+    """Result wrapper for a list of LocalTool or cached Tool objects."""
 
-    def __init__(self, tools: list[LocalTool]) -> None:
-        """Initialize with a list of LocalTool objects."""
-        self.tools: list[LocalTool] = tools
+    def __init__(self, tools: list[Any]) -> None:
+        """Initialize with a list of LocalTool or cached Tool objects."""
+        self.tools: list[Any] = tools
 
 
 class MCPClient:
-    """Client for managing remote MCP tool servers via stdio transport."""
+    """Client for MCP tool servers over stdio, streamable HTTP or SSE, backed by sessions of the shared pool."""
+
+    def __init__(
+        self, name: str, config: MCPServerConfig, on_tools_changed: Optional[Callable[[str], None]] = None
+    ) -> None:
+        """Initialize MCPClient with name and configuration.
 
-    def __init__(self, name: str, config: MCPServerConfig):
-        """Initialize MCPClient with name and configuration."""
+        on_tools_changed is called with the client name when the server notifies that its tool list changed, or when
+        the tools served from the configuration turned out to differ from the ones of the server.
+        """
         self.name: str = name
         self.config: MCPServerConfig = config
-        self.session: Any = None
-        self.exit_stack: AsyncExitStack = AsyncExitStack()
-        self.stdio: Any = None
-        self.write: Any = None
-        self.initialized: bool = False
+        self.on_tools_changed: Optional[Callable[[str], None]] = on_tools_changed
+        self._revalidation: Optional[asyncio.Task] = None
+        mcp_pool.subscribe(self.config, self._handle_message)
+
+    @property
+    def initialized(self) -> bool:
+        """Whether a live session for the server exists in the pool."""
+        return mcp_pool.is_live(self.config)
 
     async def connect(self) -> None:
-        """Establish connection to the MCP server using stdio transport."""
-        command: str = self.config.command
-        args: list[str] = self.config.args or []
-        params: StdioServerParameters = StdioServerParameters(command=command, args=args, env=None)
-        stdio_transport = await self.exit_stack.enter_async_context(stdio_client(params))
-        self.stdio, self.write = stdio_transport
-        self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
-        await self.session.initialize()
-        self.initialized = True
+        """Establish connection to the MCP server, reusing a pooled session if one exists."""
+        with span("connect", self.name):
+            await mcp_pool.get(self.config)
+
+    async def close(self) -> None:
+        """Detach from the server. The session stays in the pool until it is evicted."""
+        mcp_pool.unsubscribe(self.config, self._handle_message)
+        if self._revalidation is not None:
+            self._revalidation.cancel()
+
+    async def _handle_message(self, message: Any) -> None:
+        """Forward tools/list_changed notifications of the server to the on_tools_changed callback.
+
+        Cached results of the server are dropped, as changed tools may answer differently.
+        """
+        notification = getattr(message, "root", message)
+        if isinstance(notification, ToolListChangedNotification):
+            tool_cache.invalidate(self.config)
+            if self.on_tools_changed is not None:
+                self.on_tools_changed(self.name)
+
+    def _cached_tools(self) -> Optional[ListToolsResult]:
+        """Return the tool catalog persisted in the configuration, if lazy connect is enabled and a catalog exists."""
+        if not self.config.lazy_connect or not self.config.functions:
+            return None
+        return ListToolsResult(
+            [
+                Tool(name=name, description=func.description, inputSchema=func.parameters)
+                for name, func in self.config.functions.items()
+            ]
+        )
 
     async def list_tools(self) -> Any:
-        """List available tools from the connected MCP server."""
+        """List available tools from the connected MCP server.
+
+        With lazy connect, tools of a not yet connected server are served from the persisted function catalog.
+        """
         if not self.initialized:
+            cached = self._cached_tools()
+            if cached is not None:
+                return cached
             try:
                 await self.connect()
             except Exception as e:
                 raise ConnectionError(f"Failed to connect to MCP server '{self.name}': {e}")
-        res = await self.session.list_tools()
+        with span("list_tools", self.name):
+            res = await self._list_server_tools()
+        if self.config.functions is None:
+            self.config.functions = {}
         # fill self.config functions
         for tool in res.tools:
             func = Function(
                 description=tool.description,
                 parameters=tool.inputSchema,
             )
-            if self.config.functions is None:
-                self.config.functions = {}
             # reset if changes are detected
             if (
                 tool.name not in self.config.functions
@@ -86,13 +134,108 @@ class MCPClient:
                 or self.config.functions[tool.name].parameters != func.parameters
             ):
                 self.config.functions[tool.name] = func
+        # drop functions the server no longer provides
+        names = {tool.name for tool in res.tools}
+        for name in list(self.config.functions):
+            if name not in names:
+                del self.config.functions[name]
         return res
 
+    async def _list_server_tools(self) -> Any:
+        """List the tools of the server, reconnecting if the session was lost, as listing has no side effects."""
+        attempts = MCP_RESTART_ATTEMPTS
+        while True:
+            async with mcp_pool.lease(self.config) as session:
+                try:
+                    return await mcp_pool.request(self.config, session, session.list_tools())
+                except (anyio.ClosedResourceError, anyio.BrokenResourceError, McpError) as e:
+                    if isinstance(e, McpError) and e.error.code not in (CONNECTION_CLOSED, SESSION_TERMINATED):
+                        raise
+                    attempts -= 1
+                    if attempts < 0:
+                        raise ConnectionError(f"MCP server '{self.name}' keeps dropping the connection") from e
+            await self._restart(session)
+
+    async def _restart(self, session: ClientSession) -> None:
+        """Replace the lost session of the server, raising ConnectionError if the server cannot be reached."""
+        try:
+            await mcp_pool.restart(self.config, session)
+        except Exception as e:
+            raise ConnectionError(f"MCP server '{self.name}' is unavailable: {e}") from e
+
+    async def _revalidate(self) -> None:
+        """Compare the persisted tool catalog with the tools of the server and report drift."""
+        before = {name: (func.description, func.parameters) for name, func in (self.config.functions or {}).items()}
+        try:
+            await self.list_tools()
+        except Exception:
+            # retry on the next call
+            self._revalidation = None
+            return
+        after = {name: (func.description, func.parameters) for name, func in (self.config.functions or {}).items()}
+        if before != after and self.on_tools_changed is not None:
+            self.on_tools_changed(self.name)
+
     async def call_tool(self, tool_name: str, params: dict[str, Any]) -> Any:
-        """Call a tool on the MCP server by name with given parameters."""
-        if not self.initialized:
-            await self.connect()
-        return await self.session.call_tool(tool_name, params)
+        """Call a tool on the MCP server by name with given parameters.
+
+        The first call of a lazily connected client starts the server and revalidates its tools in the background.
+        Results of functions flagged with cache are served from the shared tool cache while they are fresh.
+        A call taking longer than the timeout of the function or server raises TimeoutError. A crashed server, or the
+        lost session of a remote server, is restarted; calls that never reached the server are repeated, calls that
+        were in flight or timed out only up to Function.retries times, as they may already have had an effect.
+        """
+        function = (self.config.functions or {}).get(tool_name)
+        cached = function is not None and function.cache
+        if cached:
+            hit, result = tool_cache.get(self.config, tool_name, params)
+            if hit:
+                return result
+        timeout = self._timeout(function)
+        retries = function.retries if function is not None else 0
+        unsent_attempts = MCP_RESTART_ATTEMPTS
+        while True:
+            async with mcp_pool.lease(self.config) as session:
+                if self.config.lazy_connect and self._revalidation is None:
+                    self._revalidation = asyncio.create_task(self._revalidate())
+                crashed = False
+                error: Optional[Exception] = None
+                try:
+                    request = mcp_pool.request(self.config, session, session.call_tool(tool_name, params))
+                    result = await asyncio.wait_for(request, timeout)
+                    break
+                except asyncio.TimeoutError:
+                    error = TimeoutError(f"Tool '{tool_name}' timed out after {timeout:g} seconds")
+                except (anyio.ClosedResourceError, anyio.BrokenResourceError, McpError) as e:
+                    if isinstance(e, McpError) and e.error.code == CONNECTION_CLOSED:
+                        crashed = True
+                        error = ConnectionError(f"MCP server '{self.name}' crashed during the call of '{tool_name}'")
+                    elif isinstance(e, McpError) and e.error.code != SESSION_TERMINATED:
+                        raise
+                    else:
+                        # the server was gone before the request was written, or rejected it for an unknown session
+                        crashed = True
+                        unsent_attempts -= 1
+                        if unsent_attempts < 0:
+                            raise ConnectionError(f"MCP server '{self.name}' keeps crashing") from e
+            if crashed:
+                await self._restart(session)
+            if error is None:
+                continue
+            if retries <= 0:
+                raise error
+            retries -= 1
+        if cached and not getattr(result, "isError", False):
+            tool_cache.put(self.config, tool_name, params, result, function.cache_ttl)
+        return result
+
+    def _timeout(self, function: Optional[Function]) -> float:
+        """Return the seconds a call of the function may take."""
+        if function is not None and function.timeout is not None:
+            return function.timeout
+        if self.config.tool_timeout is not None:
+            return self.config.tool_timeout
+        return TOOL_CALL_TIMEOUT
 
 
 class MCPLocalClient:
@@ -108,6 +251,10 @@ class MCPLocalClient:
         """No-op for local client connection."""
         pass
 
+    async def close(self) -> None:
+        """No-op for local client."""
+        pass
+
     async def list_tools(self) -> ListToolsResult:
         """Return a ListToolsResult containing all local tools."""
         return ListToolsResult(self.tools)
@@ -0,0 +1,449 @@
+"""
+mcp_pool.py: Process wide pool of MCP server sessions shared between agents.
+Sessions are keyed by (command, args, env) for spawned stdio servers and by (url, transport, headers) for remote HTTP
+and SSE servers, evicted when idle or when the pool is full, and closed on shutdown. Streamable HTTP sessions send
+their requests over keep-alive connections of one HTTP client per set of headers. The MCP SDK is imported with the
+first session, so starting the web server does not wait for it.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import anyio
+import httpx
+
+from lazy_mcp.config_utils import (
+    MCP_HTTP_KEEPALIVE_EXPIRY,
+    MCP_HTTP_MAX_CONNECTIONS,
+    MCP_HTTP_READ_TIMEOUT,
+    MCP_HTTP_TIMEOUT,
+    MCP_POOL_IDLE_TIMEOUT,
+    MCP_POOL_MAX_LIVE,
+    MCP_RESTART_ATTEMPTS,
+    MCP_RESTART_BACKOFF,
+)
+from lazy_mcp.metrics import record_span
+from lazy_mcp.models import MCPPoolSessionStats, MCPPoolStats, MCPServerConfig
+
+if TYPE_CHECKING:
+    from mcp import ClientSession
+
+logger = logging.getLogger(__name__)
+
+PoolKey = tuple[str, tuple[str, ...], tuple[tuple[str, str], ...]]
+MessageHandler = Callable[[Any], Awaitable[None]]
+T = TypeVar("T")
+
+
+def transport(config: MCPServerConfig) -> str:
+    """Return the transport of a configuration, "http" (streamable HTTP), "sse" or "stdio" for any other type."""
+    kind = config.type.lower().replace("_", "-")
+    if kind in ("http", "streamable-http", "streamablehttp"):
+        return "http"
+    return "sse" if kind == "sse" else "stdio"
+
+
+def pool_key(config: MCPServerConfig) -> PoolKey:
+    """Return the key identifying the server process, or the remote server, of a configuration."""
+    kind = transport(config)
+    if kind != "stdio":
+        return (config.url or "", (kind,), tuple(sorted((config.headers or {}).items())))
+    return (config.command, tuple(config.args or []), tuple(sorted((config.env or {}).items())))
+
+
+def _unwrap(error: BaseException) -> BaseException:
+    """Return the single exception wrapped in task group exception groups."""
+    while len(getattr(error, "exceptions", ())) == 1:
+        error = error.exceptions[0]  # type: ignore[attr-defined]
+    return error
+
+
+def describe(config: MCPServerConfig) -> str:
+    """Return the command line or URL of a server for logs and statistics."""
+    if transport(config) != "stdio":
+        return config.url or ""
+    return " ".join([config.command, *(config.args or [])])
+
+
+class PooledSession:
+    """A live MCP session owned by a dedicated task, so its transport is opened and closed in the same task."""
+
+    def __init__(
+        self,
+        key: PoolKey,
+        config: MCPServerConfig,
+        message_handler: MessageHandler,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
+        """Initialize the pooled session for a server configuration, remote HTTP servers use the given client."""
+        self.key: PoolKey = key
+        self.config: MCPServerConfig = config
+        self.http_client: Optional[httpx.AsyncClient] = http_client
+        self.session: Optional["ClientSession"] = None
+        self.in_use: int = 0
+        self.preloaded: bool = False
+        self.last_used: float = time.monotonic()
+        self.spawn_time: float = 0.0
+        self._message_handler: MessageHandler = message_handler
+        self._ready: asyncio.Event = asyncio.Event()
+        self._closing: asyncio.Event = asyncio.Event()
+        # set once the session is unusable: its task finished or the connection to a remote server broke
+        self._lost: asyncio.Event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+        self._read: Any = None
+
+    @property
+    def lost(self) -> bool:
+        """Whether the session became unusable: its task finished, or the transport broke or closed its read stream."""
+        if self._read is not None and self._read.statistics().open_send_streams == 0:
+            # e.g. the event stream of an SSE server ended, requests sent from now on would never be answered
+            self._lost.set()
+        return self._lost.is_set()
+
+    @property
+    def alive(self) -> bool:
+        """Whether the session is started and usable."""
+        return self._task is not None and not self.lost and self.session is not None
+
+    @property
+    def closed(self) -> bool:
+        """Whether the session task has finished, either by close() or because it failed, or lost its connection."""
+        return self._task is not None and (self._task.done() or self.lost)
+
+    async def start(self) -> None:
+        """Start the server process, or connect to the remote server, and wait until the session is initialized."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self._error is not None:
+            raise ConnectionError(f"Failed to start MCP server {describe(self.config)}: {self._error}") from self._error
+
+    def _transport(self) -> AsyncContextManager[tuple[Any, ...]]:
+        """Return the transport of the configuration, yielding the read and write streams first."""
+        kind = transport(self.config)
+        if kind != "stdio" and not self.config.url:
+            raise ValueError(f"MCP server of type '{self.config.type}' needs a url")
+        if kind == "http":
+            from mcp.client.streamable_http import streamable_http_client
+
+            return streamable_http_client(self.config.url, http_client=self.http_client)
+        if kind == "sse":
+            from mcp.client.sse import sse_client
+
+            # an SSE session holds its own event stream, so it gets a client of its own
+            return sse_client(
+                self.config.url,
+                headers=self.config.headers,
+                timeout=MCP_HTTP_TIMEOUT,
+                sse_read_timeout=MCP_HTTP_READ_TIMEOUT,
+            )
+        from mcp.client.stdio import StdioServerParameters, stdio_client
+
+        params = StdioServerParameters(command=self.config.command, args=self.config.args or [], env=self.config.env)
+        return stdio_client(params)
+
+    async def _run(self) -> None:
+        """Open the transport and session, keep them open until close() is called."""
+        from mcp import ClientSession
+
+        started = time.monotonic()
+        try:
+            async with AsyncExitStack() as stack:
+                streams = await stack.enter_async_context(self._transport())
+                read, write = streams[0], streams[1]
+                self._read = read
+                self.session = await stack.enter_async_context(
+                    ClientSession(read, write, message_handler=self._handle_message)
+                )
+                await self.session.initialize()
+                self.spawn_time = time.monotonic() - started
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as e:
+            self._error = _unwrap(e)
+        finally:
+            self.session = None
+            self._lost.set()
+            self._ready.set()
+
+    async def _handle_message(self, message: Any) -> None:
+        """Note a broken connection, which remote transports report as message, and forward the message."""
+        if isinstance(message, httpx.TransportError):
+            self._error = self._error or message
+            self._lost.set()
+        await self._message_handler(message)
+
+    async def request(self, request: Awaitable[T]) -> T:
+        """Await a request of the session, failing it as soon as the transport of the session breaks down.
+
+        Raises anyio.BrokenResourceError if the server could not be reached, so the request was not delivered, and
+        McpError with CONNECTION_CLOSED if the connection was lost while the request may have been in flight.
+        """
+        if self.lost:
+            if asyncio.iscoroutine(request):
+                request.close()
+            raise anyio.BrokenResourceError(f"Session of MCP server {describe(self.config)} was lost: {self._error}")
+        task = asyncio.ensure_future(request)
+        lost = asyncio.ensure_future(self._lost.wait())
+        try:
+            await asyncio.wait({task, lost}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            lost.cancel()
+            if not task.done():
+                task.cancel()
+                await asyncio.wait({task})
+        if not task.cancelled():
+            return task.result()
+        if isinstance(self._error, httpx.ConnectError):
+            raise anyio.BrokenResourceError(f"MCP server {describe(self.config)} unreachable: {self._error}")
+        from mcp.shared.exceptions import McpError
+        from mcp.types import CONNECTION_CLOSED, ErrorData
+
+        raise McpError(ErrorData(code=CONNECTION_CLOSED, message="Connection closed"))
+
+    async def close(self) -> None:
+        """Close the session and terminate the server process."""
+        self._closing.set()
+        if self._task is not None:
+            await self._task
+
+
+class MCPSessionPool:
+    """Pool of MCP sessions with idle timeout, a cap on live processes and LRU eviction."""
+
+    def __init__(self, max_live: int = MCP_POOL_MAX_LIVE, idle_timeout: float = MCP_POOL_IDLE_TIMEOUT) -> None:
+        """Initialize an empty pool."""
+        self.max_live: int = max_live
+        self.idle_timeout: float = idle_timeout
+        self.sessions: OrderedDict[PoolKey, PooledSession] = OrderedDict()
+        self.handlers: dict[PoolKey, set[MessageHandler]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.restarts: int = 0
+        self.spawn_time_total: float = 0.0
+        self.http_clients: dict[tuple[tuple[str, str], ...], httpx.AsyncClient] = {}
+        # max_in_flight and semaphore per server, kept across evictions and restarts of its session
+        self.call_limiters: dict[PoolKey, tuple[int, asyncio.Semaphore]] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def _http_client(self, config: MCPServerConfig) -> Optional[httpx.AsyncClient]:
+        """Return the shared HTTP client for the headers of a streamable HTTP server, None for other transports."""
+        if transport(config) != "http":
+            return None
+        headers = tuple(sorted((config.headers or {}).items()))
+        client = self.http_clients.get(headers)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                headers=dict(headers),
+                timeout=httpx.Timeout(MCP_HTTP_TIMEOUT, read=MCP_HTTP_READ_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=MCP_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=MCP_HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=MCP_HTTP_KEEPALIVE_EXPIRY,
+                ),
+            )
+            self.http_clients[headers] = client
+        return client
+
+    def call_limiter(self, config: MCPServerConfig) -> asyncio.Semaphore:
+        """Return the semaphore bounding the concurrent tool calls of the server to its max_in_flight.
+
+        All agents of the process share it, like the session. A changed max_in_flight applies to calls started after
+        the change.
+        """
+        key = pool_key(config)
+        limit = max(1, config.max_in_flight)
+        limiter = self.call_limiters.get(key)
+        if limiter is None or limiter[0] != limit:
+            limiter = self.call_limiters[key] = (limit, asyncio.Semaphore(limit))
+        return limiter[1]
+
+    def subscribe(self, config: MCPServerConfig, handler: MessageHandler) -> None:
+        """Register a handler for messages of the server, kept across evictions and restarts."""
+        self.handlers.setdefault(pool_key(config), set()).add(handler)
+
+    def unsubscribe(self, config: MCPServerConfig, handler: MessageHandler) -> None:
+        """Remove a message handler of the server."""
+        self.handlers.get(pool_key(config), set()).discard(handler)
+
+    def is_live(self, config: MCPServerConfig) -> bool:
+        """Whether a live session for the server exists."""
+        pooled = self.sessions.get(pool_key(config))
+        return pooled is not None and pooled.alive
+
+    async def get(self, config: MCPServerConfig) -> PooledSession:
+        """Return the live session of the server, starting the server process if needed.
+
+        The session counts as in use until it is returned, so it is not evicted while it starts.
+        """
+        key = pool_key(config)
+        pooled = self.sessions.get(key)
+        stale = pooled if pooled is not None and pooled.closed else None
+        spawned = pooled is None or stale is not None
+        if spawned:
+            self.misses += 1
+            # stored before any await, so concurrent callers share the new session instead of spawning their own
+            pooled = PooledSession(
+                key, config, lambda message: self._dispatch(key, message), http_client=self._http_client(config)
+            )
+            self.sessions[key] = pooled
+            self._ensure_reaper()
+        else:
+            self.hits += 1
+        self.sessions.move_to_end(key)
+        pooled.in_use += 1
+        try:
+            if stale is not None:
+                # release the transport of a session that lost its connection
+                await stale.close()
+            try:
+                await pooled.start()
+            except Exception:
+                if self.sessions.get(key) is pooled:
+                    del self.sessions[key]
+                raise
+            if spawned:
+                self.spawn_time_total += pooled.spawn_time
+                target = config.command if transport(config) == "stdio" else config.url or ""
+                record_span("spawn", time.monotonic() - pooled.spawn_time, pooled.spawn_time, target)
+                await self._enforce_max_live(keep=key)
+        finally:
+            pooled.in_use -= 1
+        return pooled
+
+    @asynccontextmanager
+    async def lease(self, config: MCPServerConfig) -> AsyncIterator["ClientSession"]:
+        """Borrow the session of the server for the duration of a request. Leased sessions are never evicted."""
+        pooled = await self.get(config)
+        session = pooled.session
+        if session is None:
+            raise ConnectionError(f"Session of MCP server {describe(config)} closed right after it started")
+        pooled.in_use += 1
+        try:
+            yield session
+        finally:
+            pooled.in_use -= 1
+            pooled.last_used = time.monotonic()
+
+    async def request(self, config: MCPServerConfig, session: "ClientSession", request: Awaitable[T]) -> T:
+        """Await a request of a leased session, see PooledSession.request."""
+        pooled = self.sessions.get(pool_key(config))
+        if pooled is None or pooled.session is not session:
+            return await request
+        return await pooled.request(request)
+
+    async def restart(self, config: MCPServerConfig, session: "ClientSession") -> None:
+        """Replace a session whose server crashed or whose connection was lost, retrying with exponential backoff.
+
+        Only the session passed in is closed, so concurrent callers that saw the same crash restart the server once.
+        """
+        key = pool_key(config)
+        pooled = self.sessions.get(key)
+        if pooled is not None and pooled.session is session:
+            logger.warning("Restarting session of MCP server %s", describe(config))
+            self.restarts += 1
+            await self._evict(key)
+        delay = MCP_RESTART_BACKOFF
+        for attempt in range(1, MCP_RESTART_ATTEMPTS + 1):
+            try:
+                await self.get(config)
+                return
+            except Exception as e:
+                if attempt == MCP_RESTART_ATTEMPTS:
+                    raise
+                logger.warning("Restart %s of MCP server %s failed: %s", attempt, describe(config), e)
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    async def preload(self, config: MCPServerConfig) -> None:
+        """Start the server ahead of its first use and keep it from idle eviction."""
+        pooled = await self.get(config)
+        pooled.preloaded = True
+
+    async def _dispatch(self, key: PoolKey, message: Any) -> None:
+        """Forward a session message to all handlers registered for the server."""
+        for handler in list(self.handlers.get(key, ())):
+            await handler(message)
+
+    async def _evict(self, key: PoolKey) -> None:
+        """Close and remove a session."""
+        pooled = self.sessions.pop(key, None)
+        if pooled is not None:
+            self.evictions += 1
+            logger.debug("Evicting MCP session %s", key)
+            await pooled.close()
+
+    async def _enforce_max_live(self, keep: PoolKey) -> None:
+        """Evict the least recently used idle sessions except keep while more than max_live are open."""
+        for key in list(self.sessions):
+            if len(self.sessions) <= self.max_live:
+                break
+            if key != keep and self.sessions[key].in_use == 0:
+                await self._evict(key)
+
+    async def evict_idle(self) -> None:
+        """Evict sessions that have not been used for longer than the idle timeout."""
+        now = time.monotonic()
+        for key, pooled in list(self.sessions.items()):
+            if pooled.in_use == 0 and not pooled.preloaded and now - pooled.last_used > self.idle_timeout:
+                await self._evict(key)
+
+    async def release_unsubscribed(self) -> None:
+        """Close the idle sessions no loaded client subscribes to any more, e.g. after agents were dropped."""
+        for key, pooled in list(self.sessions.items()):
+            if pooled.in_use == 0 and not pooled.preloaded and not self.handlers.get(key):
+                await self._evict(key)
+
+    def _ensure_reaper(self) -> None:
+        """Start the background task evicting idle sessions."""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def _reap(self) -> None:
+        """Periodically evict idle sessions."""
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 2))
+            await self.evict_idle()
+
+    async def close_all(self) -> None:
+        """Close all sessions and stop the reaper, used on application shutdown."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await asyncio.gather(*(self._evict(key) for key in list(self.sessions)), return_exceptions=True)
+        for client in self.http_clients.values():
+            await client.aclose()
+        self.http_clients.clear()
+
+    def stats(self) -> MCPPoolStats:
+        """Return the occupancy, hit and spawn time statistics of the pool."""
+        now = time.monotonic()
+        return MCPPoolStats(
+            live=len(self.sessions),
+            max_live=self.max_live,
+            in_use=sum(1 for pooled in self.sessions.values() if pooled.in_use),
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            restarts=self.restarts,
+            spawn_seconds_total=round(self.spawn_time_total, 3),
+            sessions=[
+                MCPPoolSessionStats(
+                    command=describe(pooled.config),
+                    in_use=pooled.in_use,
+                    preloaded=pooled.preloaded,
+                    idle_seconds=round(now - pooled.last_used, 3),
+                    spawn_seconds=round(pooled.spawn_time, 3),
+                )
+                for pooled in self.sessions.values()
+            ],
+        )
+
+
+mcp_pool = MCPSessionPool()
@@ -1,33 +1,98 @@
+import asyncio
+import datetime
 import logging
+from collections import deque
+from typing import Any, Optional
+
+from lazy_mcp.config_utils import LOG_BUFFER_CAPACITY, LOG_MESSAGE_MAX_LENGTH
+
+# argument types whose formatting does not change between logging and reading a record
+_IMMUTABLE = (str, int, float, type(None))
+
+
+def _shorten(value: Any, max_length: int) -> Any:
+    """Truncate long string arguments of a log call before they are formatted into the message."""
+    if isinstance(value, str) and len(value) > max_length:
+        return f"{value[:max_length]}… ({len(value)} characters)"
+    return value
 
 
 class MemoryLogHandler(logging.Handler):
-    """In-memory log handler for collecting logs during LLMClient operations."""
+    """In-memory log handler for collecting logs during LLMClient operations.
+
+    Records are kept in a ring buffer of fixed capacity; the oldest records are dropped when it is full. Every record
+    gets a sequence number, so readers can fetch or wait for the records after the last one they saw and learn how
+    many were dropped in between.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, capacity: int = LOG_BUFFER_CAPACITY, max_length: int = LOG_MESSAGE_MAX_LENGTH) -> None:
         """Initialize the memory log handler."""
         super().__init__()
-        self.records: list[dict[str, str]] = []
+        self.records: deque[dict[str, Any]] = deque(maxlen=capacity)
+        self.max_length: int = max_length
+        self.seq: int = 0
+        self._drained: int = 0
+        self._new_records: Optional[asyncio.Event] = None
 
     def emit(self, record: logging.LogRecord) -> None:
-        """Store a log record in memory."""
-        self.records.append(
-            {
-                "level": record.levelname,
-                "message": record.getMessage(),
-                "time": self.formatTime(record),
-            }
-        )
+        """Store a log record in memory, its message is formatted with truncated arguments once it is read."""
+        entry: dict[str, Any] = {"seq": self.seq + 1, "level": record.levelname, "time": self.formatTime(record)}
+        args = record.args
+        if isinstance(args, tuple):
+            args = tuple(_shorten(arg, self.max_length) for arg in args)
+        if isinstance(record.msg, str) and (
+            not args or isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE) for arg in args)
+        ):
+            entry.update(message=None, msg=record.msg, args=args)
+        else:
+            # mutable objects may change before the record is read
+            entry["message"] = self._format(record.msg, args)
+        self.seq += 1
+        self.records.append(entry)
+        if self._new_records is not None:
+            self._new_records.set()
+            self._new_records = None
+
+    def _format(self, msg: Any, args: Any) -> str:
+        """Format a log message like LogRecord.getMessage does and truncate it."""
+        message = str(msg)
+        if args:
+            message = message % args
+        return _shorten(message, self.max_length)
 
     def formatTime(self, record: logging.LogRecord) -> str:
         """Format the log record time as a string."""
-        import datetime
-
         ct = datetime.datetime.fromtimestamp(record.created)
         return ct.strftime("%Y-%m-%d %H:%M:%S")
 
-    def get_and_clear_logs(self) -> list[dict[str, str]]:
-        """Return and clear all stored log records."""
-        logs = self.records.copy()
-        self.records.clear()
-        return logs
+    def entries_since(self, seq: int) -> tuple[list[dict[str, Any]], int]:
+        """Return the stored records after seq and how many records after seq were already dropped."""
+        if not self.records or self.records[-1]["seq"] <= seq:
+            return [], 0
+        missed = max(0, self.records[0]["seq"] - seq - 1)
+        entries = [entry for entry in self.records if entry["seq"] > seq]
+        for entry in entries:
+            if entry["message"] is None:
+                entry["message"] = self._format(entry.pop("msg"), entry.pop("args"))
+        return entries, missed
+
+    async def wait_for_entries(self, seq: int, timeout: float) -> tuple[list[dict[str, Any]], int]:
+        """Wait up to timeout seconds for records after seq, then return them as entries_since does."""
+        if not self.records or self.records[-1]["seq"] <= seq:
+            if self._new_records is None:
+                self._new_records = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._new_records.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.entries_since(seq)
+
+    def get_and_clear_logs(self) -> tuple[list[dict[str, Any]], int]:
+        """Return the records not returned by a previous call and how many of them were already dropped."""
+        entries, missed = self.entries_since(self._drained)
+        self._drained = self.seq
+        return entries, missed
+
+    def approx_bytes(self) -> int:
+        """Return the approximate size of the buffered messages."""
+        return sum(len(entry["msg"] if entry["message"] is None else entry["message"]) for entry in self.records)
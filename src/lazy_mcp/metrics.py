@@ -0,0 +1,140 @@
+"""
+metrics.py: Latency spans, histograms and counters rendered in the Prometheus text format.
+Spans are labeled with the agent of the current context and a target (tool or server name); while a turn timeline is
+active, they are also recorded on it so the frontend can show where the time of a turn went.
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from lazy_mcp.models import TimelineSpan
+
+# upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+current_agent: ContextVar[str] = ContextVar("current_agent", default="")
+_current_timeline: ContextVar[Optional["Timeline"]] = ContextVar("current_timeline", default=None)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    """Format labels as {name="value",...}."""
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative histogram of observations per label set."""
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """Initialize an empty histogram."""
+        self.name: str = name
+        self.help: str = help
+        self.buckets: tuple[float, ...] = buckets
+        self.series: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation."""
+        key = tuple(sorted(labels.items()))
+        counts, total = self.series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> list[str]:
+        """Return the lines of the histogram in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+                cumulative += count
+                bucket_labels = _format_labels(labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total[0]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    def __init__(self, name: str, help: str) -> None:
+        """Initialize an empty counter."""
+        self.name: str = name
+        self.help: str = help
+        self.series: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the counter."""
+        key = tuple(sorted(labels.items()))
+        self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        """Return the lines of the counter in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(labels)} {value}" for labels, value in sorted(self.series.items()))
+        return lines
+
+
+span_seconds = Histogram("lazy_mcp_span_seconds", "Duration of completions, tool calls and other operations.")
+tokens_total = Counter("lazy_mcp_tokens_total", "Tokens reported by the LLM API.")
+tool_calls_total = Counter("lazy_mcp_tool_calls_total", "Tool calls by outcome.")
+
+
+class Timeline:
+    """Spans of a single chat turn, relative to its start."""
+
+    def __init__(self) -> None:
+        """Start an empty timeline."""
+        self.start: float = time.monotonic()
+        self.spans: list[TimelineSpan] = []
+
+
+def start_timeline() -> Timeline:
+    """Record the spans of the current context, and of tasks started from it, on a new timeline."""
+    timeline = Timeline()
+    _current_timeline.set(timeline)
+    return timeline
+
+
+def stop_timeline() -> None:
+    """Stop recording spans of the current context on a timeline."""
+    _current_timeline.set(None)
+
+
+def record_span(name: str, started: float, duration: float, target: str = "") -> None:
+    """Record a finished span in the histogram and on the active timeline."""
+    span_seconds.observe(duration, span=name, agent=current_agent.get(), target=target)
+    timeline = _current_timeline.get()
+    if timeline is not None:
+        timeline.spans.append(
+            TimelineSpan(
+                name=name, target=target, start=round(started - timeline.start, 4), duration=round(duration, 4)
+            )
+        )
+
+
+@contextmanager
+def span(name: str, target: str = "") -> Iterator[None]:
+    """Measure the duration of the enclosed block as a span."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        record_span(name, started, time.monotonic() - started, target)
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text format."""
+    lines = [*span_seconds.render(), *tokens_total.render(), *tool_calls_total.render()]
+    return "\n".join(lines) + "\n"
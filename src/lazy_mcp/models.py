@@ -5,7 +5,9 @@ Pydantic models for FastAPI endpoints, tool call payloads and configuration.
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
+
+from lazy_mcp.config_utils import CONTEXT_WINDOW, SUMMARIZE_TOKEN_BUDGET, TOOL_CACHE_TTL
 
 
 # Chat models
@@ -13,9 +15,45 @@ class ChatRequest(BaseModel):
     message: str
 
 
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    # local estimates of the last request of a turn
+    tool_schema_tokens: int = 0
+    estimated_prompt_tokens: int = 0
+    context_window: int = 0
+
+
+class TimelineSpan(BaseModel):
+    name: str
+    target: str = ""
+    # seconds since the start of the turn
+    start: float
+    duration: float
+
+
 class ChatResponse(BaseModel):
     reply: List[str]
     tokens_used: int = 0
+    streamed: bool = False
+    usage: Optional[TokenUsage] = None
+    timeline: Optional[List[TimelineSpan]] = None
+    # the turn was stopped by the user before it finished
+    cancelled: bool = False
+
+
+# Streaming chat frames
+class ChatDelta(BaseModel):
+    delta: str
+    index: int = 0
+
+
+class ToolCallEvent(BaseModel):
+    id: Optional[str] = None
+    name: str
+    args: Any = None
+    rejected: bool = False
 
 
 # Log models
@@ -23,10 +61,13 @@ class LogEntry(BaseModel):
     level: str
     message: str
     time: str
+    seq: Optional[int] = None
 
 
 class LogsResponse(BaseModel):
     logs: List[LogEntry]
+    # records lost because the ring buffer overflowed before they were delivered
+    dropped: int = 0
 
 
 # History models
@@ -35,12 +76,14 @@ class ClearHistoryResponse(BaseModel):
 
 
 class HistoryMessage(BaseModel):
+    id: Optional[int] = None
     role: str
     content: str
 
 
 class HistoryResponse(BaseModel):
     messages: List[HistoryMessage]
+    has_more: bool = False
 
 
 # Agent models
@@ -71,9 +114,9 @@ class ToolCallPending(BaseModel):
     description: Optional[str] = None
 
 
-# Tool call confirmation response
-class ToolCallConfirmation(BaseModel):
-    tool_call_confirmed: "ConfirmationStateResponse"
+# Tool call confirmation response, one entry per pending tool call
+class ToolCallsConfirmation(BaseModel):
+    tool_calls_confirmed: List["ConfirmationStateResponse"]
 
 
 # Pydantic models for configuration
@@ -97,16 +140,127 @@ class Function(BaseModel):
     parameters: dict[str, Any]
     allowed: bool = True
     confirmed: ConfirmationState = Field(default=ConfirmationState.ALWAYS_ASK)
+    # longest result kept in the history, overrides the limit of the server
+    max_result_length: Optional[int] = None
+    # whether results of the idempotent function are cached, and for how many seconds
+    cache: bool = False
+    cache_ttl: float = TOOL_CACHE_TTL
+    # seconds a call may take, overrides the timeout of the server
+    timeout: Optional[float] = None
+    # how often a call that timed out or lost its server is repeated, only for idempotent functions
+    retries: int = 0
 
 
 class MCPServerConfig(BaseModel):
+    # "stdio" spawns command, "http" (streamable HTTP) and "sse" connect to a running server at url
     type: str
-    command: str
+    command: str = ""
     args: Optional[list[str]] = Field(default_factory=list)
+    url: Optional[str] = None
+    # HTTP headers sent to a remote server, e.g. for authorization
+    headers: Optional[dict[str, str]] = None
     gallery: Optional[str] = None
     version: Optional[str] = None
     functions: Optional[dict[str, Function]] = None
+    env: Optional[dict[str, str]] = None
     allowed: bool = True
+    max_in_flight: int = 4
+    # opt in to serving the tool catalog stored in the configuration and starting the server on its first call
+    lazy_connect: bool = False
+    preload: bool = False
+    # longest tool result kept in the history, longer ones are stored as blobs; 0 keeps all, None uses the default
+    max_result_length: Optional[int] = None
+    # seconds a tool call may take, None uses the default
+    tool_timeout: Optional[float] = None
+
+
+# MCP session pool statistics
+class MCPPoolSessionStats(BaseModel):
+    command: str
+    in_use: int
+    preloaded: bool
+    idle_seconds: float
+    spawn_seconds: float
+
+
+class MCPPoolStats(BaseModel):
+    live: int
+    max_live: int
+    in_use: int
+    hits: int
+    misses: int
+    evictions: int
+    restarts: int = 0
+    spawn_seconds_total: float
+    sessions: List[MCPPoolSessionStats]
+
+
+# Agent manager statistics
+class ResidentAgentStats(BaseModel):
+    agent: str
+    in_use: int
+    # turns waiting for the running turn of the agent
+    queued_turns: int
+    idle_seconds: float
+    messages: int
+    log_records: int
+    # approximate size of configuration, history and buffered logs
+    approx_bytes: int
+
+
+class AgentManagerStats(BaseModel):
+    resident: int
+    max_resident: int
+    idle_ttl: float
+    loads: int
+    evictions: int
+    agents: List[ResidentAgentStats]
+
+
+# LLM scheduler statistics
+class LLMSchedulerStats(BaseModel):
+    # waiting requests by priority and by agent
+    queued: dict[str, int]
+    queued_by_agent: dict[str, int]
+    admitted: int
+    rate_limited: int
+    retried: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+    # seconds left of the pause after a 429
+    paused_seconds: float
+    requests_per_minute: int
+    tokens_per_minute: int
+    # what is left of the budgets, negative while completions used more tokens than estimated
+    request_budget: float
+    token_budget: float
+
+
+# Tool cache models
+class ToolCacheStats(BaseModel):
+    hits: int
+    misses: int
+    entries: int
+
+
+# Tool schema models
+class ToolSchemaReport(BaseModel):
+    server: str
+    tools: int
+    raw_tokens: int
+    compact_tokens: int
+    saved_tokens: int
+
+
+# Tool retrieval models
+class ToolRetrievalEvaluation(BaseModel):
+    cases: int
+    k: int
+    recall: float
+    fallbacks: int
+    full_tool_tokens: int
+    mean_selected_tool_tokens: float
+    tokens_saved_ratio: float
 
 
 class Message(BaseModel):
@@ -118,9 +272,26 @@ class Message(BaseModel):
     function_call: Optional[Any] = None
     tool_calls: Optional[Any] = None
     tool_call_id: Optional[str] = None
+    # stable id assigned when the message is appended to the history, not sent to the LLM
+    id: Optional[int] = None
+    # marks the rolling summary of the older conversation
+    summary: Optional[bool] = None
+    # cached token count of the message, see tokens.estimate_message_tokens
+    _tokens: Optional[int] = PrivateAttr(default=None)
+
+    def to_api(self) -> dict[str, Any]:
+        """Return the message as sent to the completion API."""
+        return self.model_dump(exclude={"id", "summary"})
 
 
 class AgentConfig(BaseModel):
     description: str = ""
     servers: dict[str, MCPServerConfig]
     history: Optional[list[Message]] = Field(default_factory=list)
+    next_message_id: int = 0
+    # estimated history tokens above which older turns are folded into a rolling summary
+    token_budget: int = SUMMARIZE_TOKEN_BUDGET
+    # tokens of the model context, history and tools are trimmed to fit it before each request
+    context_window: int = CONTEXT_WINDOW
+    # number of tools ranked relevant to the user message sent with each completion, 0 sends all allowed tools
+    tool_top_k: int = 0
@@ -0,0 +1,264 @@
+"""
+routing.py: Sticky routing of requests to the worker processes of a multi-worker deployment.
+Every agent is owned by one worker, chosen by consistent hashing of its name, so its resident state, turn order and
+file writes stay in a single process. The router is a small ASGI app in front of the workers that proxies HTTP requests
+by their agent query parameter and chat websockets message by message to the owner of the agent the message is for.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import time
+from contextlib import suppress
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import parse_qs
+
+import httpx
+import websockets
+from starlette.types import Receive, Scope, Send
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from lazy_mcp.config_utils import (
+    DEFAULT_AGENT_NAME,
+    HASH_RING_REPLICAS,
+    WORKER_INDEX,
+    WORKER_STARTUP_TIMEOUT,
+    WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# headers describing a single connection, not forwarded by the proxy
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "host", "te", "trailer"}
+
+
+def _hash(key: str) -> int:
+    """Return a hash of key that is stable across processes, unlike hash()."""
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring assigning keys to workers, with virtual nodes to spread the keys evenly.
+
+    Changing the number of workers only moves the keys of the added or removed workers.
+    """
+
+    def __init__(self, workers: int, replicas: int = HASH_RING_REPLICAS) -> None:
+        """Place replicas virtual nodes of every worker on the ring."""
+        points = sorted(
+            (_hash(f"worker-{worker}-{replica}"), worker) for worker in range(workers) for replica in range(replicas)
+        )
+        self.workers: int = workers
+        self._hashes: list[int] = [point for point, _ in points]
+        self._owners: list[int] = [worker for _, worker in points]
+
+    def owner(self, key: str) -> int:
+        """Return the worker owning a key, the one of the first virtual node at or after its hash."""
+        index = bisect.bisect_left(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+@lru_cache(maxsize=8)
+def hash_ring(workers: int = WORKERS) -> HashRing:
+    """Return the hash ring of a number of workers."""
+    return HashRing(workers)
+
+
+def owns(agent: str) -> bool:
+    """Whether this worker owns the agent. Always true for a single worker."""
+    return WORKERS == 1 or hash_ring().owner(agent) == WORKER_INDEX
+
+
+class WorkerRouter:
+    """ASGI app proxying requests to the worker owning their agent.
+
+    Requests with an agent query parameter go to its owner, /reset_default to the owner of the default agent, a worker
+    query parameter pins a request (e.g. for /metrics) to one worker, and everything else goes to the first worker.
+    """
+
+    def __init__(self, upstreams: list[str]) -> None:
+        """Initialize the router for the workers listening on the given host:port addresses, in worker order."""
+        self.upstreams: list[str] = upstreams
+        self.ring: HashRing = hash_ring(len(upstreams))
+        self.client: httpx.AsyncClient = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=5.0))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle an ASGI connection."""
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._proxy_http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            websocket = WebSocket(scope, receive, send)
+            if scope["path"] == "/chat":
+                await self._proxy_chat(websocket)
+            else:
+                await self._proxy_websocket(websocket, self._route(scope))
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        """Start serving once the workers are up, close the pooled upstream connections on shutdown."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self._wait_for_workers()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _wait_for_workers(self, timeout: float = WORKER_STARTUP_TIMEOUT) -> None:
+        """Wait until every worker accepts connections, which uvicorn does once the startup of the app completed."""
+        deadline = time.monotonic() + timeout
+        for upstream in self.upstreams:
+            host, port = upstream.rsplit(":", 1)
+            while True:
+                try:
+                    _, writer = await asyncio.open_connection(host, int(port))
+                except OSError:
+                    if time.monotonic() > deadline:
+                        logger.warning("Worker at %s did not start within %s seconds", upstream, timeout)
+                        return
+                    await asyncio.sleep(0.05)
+                    continue
+                writer.close()
+                await writer.wait_closed()
+                break
+
+    def _route(self, scope: Scope) -> int:
+        """Return the worker a request is routed to by its path and query."""
+        query = parse_qs(scope.get("query_string", b"").decode())
+        if "worker" in query:
+            try:
+                return int(query["worker"][0]) % len(self.upstreams)
+            except ValueError:
+                pass
+        if "agent" in query:
+            return self.ring.owner(query["agent"][0])
+        if scope["path"] == "/reset_default":
+            return self.ring.owner(DEFAULT_AGENT_NAME)
+        return 0
+
+    def _url(self, scheme: str, worker: int, scope: Scope) -> str:
+        """Return the URL of a request on a worker."""
+        query = scope.get("query_string", b"").decode()
+        return f"{scheme}://{self.upstreams[worker]}{scope['path']}" + (f"?{query}" if query else "")
+
+    async def _proxy_http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Forward an HTTP request to its worker and stream the response back."""
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in scope["headers"]
+            if name.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+        ]
+        request = self.client.build_request(
+            scope["method"], self._url("http", self._route(scope), scope), headers=headers, content=body
+        )
+        try:
+            response = await self.client.send(request, stream=True)
+        except httpx.TransportError as e:
+            logger.error("Worker for %s unavailable: %s", scope["path"], e)
+            await send({"type": "http.response.start", "status": 502, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"Worker unavailable"})
+            return
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": response.status_code,
+                    "headers": [
+                        (name, value)
+                        for name, value in response.headers.raw
+                        if name.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+                    ],
+                }
+            )
+            # raw bytes, the content encoding is passed through unchanged
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await response.aclose()
+
+    async def _connect(self, worker: int, websocket: WebSocket) -> websockets.ClientConnection:
+        """Open the websocket of a worker for the path and query of a client websocket."""
+        return await websockets.connect(self._url("ws", worker, websocket.scope), max_size=None)
+
+    async def _pump(self, upstream: websockets.ClientConnection, websocket: WebSocket) -> None:
+        """Forward the messages of a worker to the client, closing the client socket once the worker closed."""
+        try:
+            async for message in upstream:
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+        except (websockets.ConnectionClosed, WebSocketDisconnect, RuntimeError):
+            pass
+        with suppress(WebSocketDisconnect, RuntimeError):
+            await websocket.close()
+
+    async def _proxy_websocket(self, websocket: WebSocket, worker: int) -> None:
+        """Connect a client websocket to the same websocket of one worker."""
+        try:
+            upstream = await self._connect(worker, websocket)
+        except (OSError, websockets.InvalidHandshake) as e:
+            logger.error("Worker %s unavailable for %s: %s", worker, websocket.url.path, e)
+            await websocket.close(code=1011)
+            return
+        await websocket.accept()
+        pump = asyncio.create_task(self._pump(upstream, websocket))
+        try:
+            while True:
+                await upstream.send(await websocket.receive_text())
+        except (WebSocketDisconnect, RuntimeError, websockets.ConnectionClosed):
+            pass
+        finally:
+            pump.cancel()
+            await upstream.close()
+
+    async def _proxy_chat(self, websocket: WebSocket) -> None:
+        """Forward every chat message to the worker owning its agent.
+
+        Stop and confirmation messages carry no agent and go to the worker of the last chat message. Closing the client
+        socket closes the sockets of all workers, which cancels their running turns.
+        """
+        await websocket.accept()
+        upstreams: dict[int, websockets.ClientConnection] = {}
+        pumps: list[asyncio.Task] = []
+        current: Optional[int] = None
+        try:
+            while True:
+                text = await websocket.receive_text()
+                try:
+                    data = json.loads(text)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    data = {}
+                if current is None or not ("stop" in data or "tool_calls_confirmed" in data):
+                    current = self.ring.owner(data.get("agent", DEFAULT_AGENT_NAME))
+                if current not in upstreams:
+                    upstream = await self._connect(current, websocket)
+                    upstreams[current] = upstream
+                    pumps.append(asyncio.create_task(self._pump(upstream, websocket)))
+                await upstreams[current].send(text)
+        except (WebSocketDisconnect, RuntimeError, websockets.ConnectionClosed):
+            pass
+        except (OSError, websockets.InvalidHandshake) as e:
+            logger.error("Worker %s unavailable for chat: %s", current, e)
+            with suppress(RuntimeError):
+                await websocket.close(code=1011)
+        finally:
+            for pump in pumps:
+                pump.cancel()
+            for upstream in upstreams.values():
+                await upstream.close()
@@ -0,0 +1,176 @@
+"""
+sqlite_store.py: SQLite backend of the agent store.
+Agents, server configurations, function flags and history rows live in indexed tables of one WAL mode database.
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from lazy_mcp.agent_store import AgentStore
+from lazy_mcp.config_utils import SQLITE_BUSY_TIMEOUT_MS, SQLITE_PATH
+from lazy_mcp.models import AgentConfig, Function, MCPServerConfig, Message
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+    name TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS servers (
+    agent TEXT NOT NULL REFERENCES agents(name) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    config TEXT NOT NULL,
+    PRIMARY KEY (agent, name)
+);
+CREATE TABLE IF NOT EXISTS functions (
+    agent TEXT NOT NULL,
+    server TEXT NOT NULL,
+    name TEXT NOT NULL,
+    allowed INTEGER NOT NULL,
+    confirmed TEXT NOT NULL,
+    config TEXT NOT NULL,
+    PRIMARY KEY (agent, server, name),
+    FOREIGN KEY (agent, server) REFERENCES servers(agent, name) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS history (
+    agent TEXT NOT NULL REFERENCES agents(name) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (agent, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteAgentStore(AgentStore):
+    """Stores agents in a SQLite database in WAL mode, which several processes may use at the same time."""
+
+    def __init__(self, path: Path = SQLITE_PATH) -> None:
+        """Open (and create) the database."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        # workers of a multi-worker deployment share the database, wait for their writes instead of failing
+        self.connection.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        self.connection.executescript(SCHEMA)
+        # the writer thread and the event loop share the connection, a transaction must not see the other's statements
+        self._lock = threading.Lock()
+        self._saved_configs: dict[str, str] = {}
+        self._data_version: int = self._read_data_version()
+
+    def _read_data_version(self) -> int:
+        """Return the counter SQLite increments whenever another connection commits to the database."""
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def list_agents(self) -> list[str]:
+        """Return the names of all stored agents."""
+        with self._lock:
+            return [row[0] for row in self.connection.execute("SELECT name FROM agents ORDER BY name")]
+
+    def exists(self, agent: str) -> bool:
+        """Whether a configuration for the agent exists."""
+        with self._lock:
+            return self.connection.execute("SELECT 1 FROM agents WHERE name = ?", (agent,)).fetchone() is not None
+
+    def load(self, agent: str, with_history: bool = True) -> Optional[AgentConfig]:
+        """Load the configuration of an agent and optionally its history, None if the agent does not exist."""
+        with self._lock:
+            row = self.connection.execute("SELECT config FROM agents WHERE name = ?", (agent,)).fetchone()
+            if row is None:
+                return None
+            functions: dict[str, dict[str, Function]] = {}
+            for server, name, config in self.connection.execute(
+                "SELECT server, name, config FROM functions WHERE agent = ?", (agent,)
+            ):
+                functions.setdefault(server, {})[name] = Function.model_validate_json(config)
+            servers = {}
+            for name, config in self.connection.execute("SELECT name, config FROM servers WHERE agent = ?", (agent,)):
+                server = MCPServerConfig.model_validate_json(config)
+                server.functions = functions.get(name, server.functions)
+                servers[name] = server
+            agent_config = AgentConfig(**json.loads(row[0]), servers=servers)
+            if with_history:
+                agent_config.history = [
+                    Message.model_validate_json(row[0])
+                    for row in self.connection.execute(
+                        "SELECT message FROM history WHERE agent = ? ORDER BY seq", (agent,)
+                    )
+                ]
+            return agent_config
+
+    def stores_history(self, agent: str) -> bool:
+        """The history is always stored in its own table."""
+        return True
+
+    def save_config(self, agent: str, agent_config: AgentConfig) -> None:
+        """Write the configuration of an agent without its history, skipped if nothing changed."""
+        data = agent_config.model_dump_json(exclude={"history"})
+        with self._lock:
+            data_version = self._read_data_version()
+            if data_version != self._data_version:
+                # another process wrote to the database, the remembered configurations may be stale
+                self._saved_configs.clear()
+                self._data_version = data_version
+            if self._saved_configs.get(agent) == data:
+                return
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                self.connection.execute(
+                    "INSERT INTO agents (name, description, config) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET description = excluded.description, config = excluded.config",
+                    (agent, agent_config.description, agent_config.model_dump_json(exclude={"servers", "history"})),
+                )
+                self.connection.execute("DELETE FROM servers WHERE agent = ?", (agent,))
+                for name, server in agent_config.servers.items():
+                    self.connection.execute(
+                        "INSERT INTO servers (agent, name, config) VALUES (?, ?, ?)",
+                        (agent, name, server.model_dump_json(exclude={"functions"})),
+                    )
+                    self.connection.executemany(
+                        "INSERT INTO functions (agent, server, name, allowed, confirmed, config) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (agent, name, function_name, int(func.allowed), func.confirmed, func.model_dump_json())
+                            for function_name, func in (server.functions or {}).items()
+                        ],
+                    )
+            self._saved_configs[agent] = data
+
+    def append_history(self, agent: str, messages: list[Message]) -> None:
+        """Append messages to the history of an agent."""
+        if not messages:
+            return
+        with self._lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            (start,) = self.connection.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM history WHERE agent = ?", (agent,)
+            ).fetchone()
+            self._insert_history(agent, start, messages)
+
+    def rewrite_history(self, agent: str, messages: list[Message]) -> None:
+        """Replace the history of an agent."""
+        with self._lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute("DELETE FROM history WHERE agent = ?", (agent,))
+            self._insert_history(agent, 0, messages)
+
+    def _insert_history(self, agent: str, start: int, messages: list[Message]) -> None:
+        """Insert messages as history rows keyed by their message id, or consecutively from start without one."""
+        self.connection.executemany(
+            "INSERT INTO history (agent, seq, message) VALUES (?, ?, ?)",
+            [
+                (agent, message.id if message.id is not None else start + i, message.model_dump_json())
+                for i, message in enumerate(messages)
+            ],
+        )
+
+    def delete(self, agent: str) -> None:
+        """Delete the configuration and history of an agent."""
+        with self._lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM agents WHERE name = ?", (agent,))
+            self._saved_configs.pop(agent, None)
@@ -0,0 +1,65 @@
+"""
+tokens.py: Local estimates of the number of tokens of messages and tool schemas.
+Uses tiktoken when it is installed (pip install lazy-mcp[tokens]) and a character based estimate otherwise.
+"""
+
+import json
+from functools import lru_cache
+from typing import Any, Optional
+
+from lazy_mcp.models import Message
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+# average number of characters per token of English text and JSON, used without tiktoken
+CHARS_PER_TOKEN = 4
+# tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+# tokens the API adds around the list of tools
+TOOLS_OVERHEAD = 12
+# encoding used for deployments unknown to tiktoken
+DEFAULT_ENCODING = "o200k_base"
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: Optional[str]) -> Any:
+    """Return the tiktoken encoding of a model, None without tiktoken."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def estimate_text_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count the tokens of a text with the encoding of the model, or estimate them without tiktoken."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def estimate_message_tokens(message: Message, model: Optional[str] = None) -> int:
+    """Return the number of tokens a message occupies in the prompt, cached on the message."""
+    if message._tokens is None:
+        tokens = MESSAGE_OVERHEAD + estimate_text_tokens(message.content or "", model)
+        if message.tool_calls:
+            tokens += estimate_text_tokens(json.dumps(message.tool_calls, default=str), model)
+        message._tokens = tokens
+    return message._tokens
+
+
+def estimate_history_tokens(history: list[Message], model: Optional[str] = None) -> int:
+    """Return the number of tokens of a list of messages."""
+    return sum(estimate_message_tokens(message, model) for message in history)
+
+
+def estimate_tools_tokens(tools: list[dict[str, Any]], model: Optional[str] = None) -> int:
+    """Return the number of tokens of the tool schemas sent with a request."""
+    if not tools:
+        return 0
+    return TOOLS_OVERHEAD + estimate_text_tokens(json.dumps(tools, separators=(",", ":"), default=str), model)
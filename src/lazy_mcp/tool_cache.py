@@ -0,0 +1,69 @@
+"""
+tool_cache.py: Process wide LRU cache of the results of idempotent tool calls.
+Entries are keyed by the server process (see mcp_pool.pool_key), the tool and the canonicalized arguments, so agents
+using the same server share them. Caching is opt-in per function with Function.cache and Function.cache_ttl.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from lazy_mcp.config_utils import TOOL_CACHE_MAX_ENTRIES
+from lazy_mcp.mcp_pool import PoolKey, pool_key
+from lazy_mcp.models import MCPServerConfig, ToolCacheStats
+
+CacheKey = tuple[PoolKey, str, str]
+
+
+def canonical_args(params: dict[str, Any]) -> str:
+    """Serialize tool arguments independent of key order and whitespace."""
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolCallCache:
+    """Bounded LRU of tool results with a time to live per entry and hit/miss counters per tool."""
+
+    def __init__(self, max_entries: int = TOOL_CACHE_MAX_ENTRIES) -> None:
+        """Initialize an empty cache."""
+        self.max_entries: int = max_entries
+        self.entries: OrderedDict[CacheKey, tuple[float, Any]] = OrderedDict()
+        self.counters: dict[tuple[PoolKey, str], list[int]] = {}
+
+    def get(self, config: MCPServerConfig, tool_name: str, params: dict[str, Any]) -> tuple[bool, Any]:
+        """Return (True, result) for a live entry and (False, None) otherwise, counting the hit or miss."""
+        key = (pool_key(config), tool_name, canonical_args(params))
+        counters = self.counters.setdefault(key[:2], [0, 0])
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.entries.move_to_end(key)
+            counters[0] += 1
+            return True, entry[1]
+        if entry is not None:
+            del self.entries[key]
+        counters[1] += 1
+        return False, None
+
+    def put(self, config: MCPServerConfig, tool_name: str, params: dict[str, Any], result: Any, ttl: float) -> None:
+        """Store a result for ttl seconds, evicting the least recently used entries beyond max_entries."""
+        key = (pool_key(config), tool_name, canonical_args(params))
+        self.entries[key] = (time.monotonic() + ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, config: MCPServerConfig, tool_name: Optional[str] = None) -> None:
+        """Drop the entries of a server, or only of one of its tools."""
+        server = pool_key(config)
+        for key in [key for key in self.entries if key[0] == server and (tool_name is None or key[1] == tool_name)]:
+            del self.entries[key]
+
+    def stats(self, config: MCPServerConfig, tool_name: str) -> ToolCacheStats:
+        """Return the hit and miss counters and the number of live entries of a tool."""
+        server = pool_key(config)
+        hits, misses = self.counters.get((server, tool_name), (0, 0))
+        entries = sum(1 for key in self.entries if key[0] == server and key[1] == tool_name)
+        return ToolCacheStats(hits=hits, misses=misses, entries=entries)
+
+
+tool_cache = ToolCallCache()
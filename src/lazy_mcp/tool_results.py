@@ -0,0 +1,150 @@
+"""
+tool_results.py: Conversion of tool results to the text stored in the history.
+Oversized results are spilled to a content-addressed blob store of the agent on disk; the history only keeps a preview
+and a handle the LLM can page through with the read_tool_result tool.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from mcp.types import CallToolResult, EmbeddedResource, ResourceLink, TextContent, TextResourceContents
+
+from lazy_mcp.agent_store import write_atomic
+from lazy_mcp.config_utils import (
+    BLOB_MAX_BYTES,
+    BLOB_TTL,
+    TOOL_RESULT_PAGE_LENGTH,
+    TOOL_RESULT_PREVIEW_LENGTH,
+)
+
+
+def _content_text(item: Any) -> str:
+    """Return the text of a single content block of a tool result, or a short placeholder for binary content."""
+    if isinstance(item, TextContent):
+        return item.text
+    if isinstance(item, EmbeddedResource):
+        if isinstance(item.resource, TextResourceContents):
+            return item.resource.text
+        return f"[binary resource {item.resource.uri} ({item.resource.mimeType or 'unknown type'})]"
+    if isinstance(item, ResourceLink):
+        return f"[resource {item.uri}]"
+    data = getattr(item, "data", None)
+    if data is not None:
+        kind = getattr(item, "type", "binary")
+        return f"[{kind} content ({getattr(item, 'mimeType', None) or 'unknown type'}), {len(data)} base64 characters]"
+    return str(item)
+
+
+def result_text(result: Any) -> str:
+    """Extract the text of a tool result.
+
+    For an MCP CallToolResult the text blocks are joined and binary blocks replaced by placeholders; structured content
+    is used if there are no content blocks. Results of local tools are returned as text or JSON.
+    """
+    if isinstance(result, CallToolResult):
+        text = "\n".join(_content_text(item) for item in result.content)
+        if not text and result.structuredContent is not None:
+            text = json.dumps(result.structuredContent)
+        return f"Error: {text}" if result.isError else text
+    if result is None:
+        return ""
+    if isinstance(result, str):
+        return result
+    if isinstance(result, (dict, list)):
+        return json.dumps(result, default=str)
+    return str(result)
+
+
+class BlobStore:
+    """Stores texts on disk under the SHA-256 of their content, so storing the same result twice is free.
+
+    Every write deletes the texts not read for longer than ttl seconds and the least recently read ones beyond max_bytes.
+    """
+
+    def __init__(self, root: Path, ttl: float = BLOB_TTL, max_bytes: int = BLOB_MAX_BYTES) -> None:
+        """Initialize the store, the directory is created on first write."""
+        self.root: Path = root
+        self.ttl: float = ttl
+        self.max_bytes: int = max_bytes
+
+    def _path(self, handle: str) -> Optional[Path]:
+        """Return the file of a handle, None for malformed handles."""
+        if len(handle) != 64 or any(c not in "0123456789abcdef" for c in handle):
+            return None
+        return self.root / handle[:2] / f"{handle}.txt"
+
+    def put(self, text: str) -> str:
+        """Store a text and return its handle."""
+        handle = hashlib.sha256(text.encode()).hexdigest()
+        path = self._path(handle)
+        assert path is not None
+        if path.exists():
+            os.utime(path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(path, text)
+        self._prune(keep=path)
+        return handle
+
+    def get(self, handle: str) -> Optional[str]:
+        """Return the stored text of a handle, None if it is unknown."""
+        path = self._path(handle)
+        if path is None or not path.exists():
+            return None
+        # the modification time marks the last use
+        os.utime(path)
+        return path.read_text()
+
+    def _prune(self, keep: Path) -> None:
+        """Delete the expired texts and the least recently used ones beyond the size cap, except keep."""
+        blobs = []
+        for path in self.root.glob("*/*.txt"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in blobs)
+        expired = time.time() - self.ttl
+        for mtime, size, path in sorted(blobs):
+            if path != keep and (mtime < expired or total > self.max_bytes):
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self) -> None:
+        """Delete all stored texts."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def spill(text: str, max_length: int, store: BlobStore) -> str:
+    """Return the text for the history: unchanged if it fits max_length, otherwise a preview and a blob handle.
+
+    A max_length of 0 keeps results of any size.
+    """
+    if max_length <= 0 or len(text) <= max_length:
+        return text
+    handle = store.put(text)
+    preview = text[: min(TOOL_RESULT_PREVIEW_LENGTH, max_length)]
+    return (
+        f"{preview}\n[truncated: the result has {len(text)} characters and is stored as '{handle}'. "
+        f"Call read_tool_result with this handle and an offset to read more.]"
+    )
+
+
+def read_page(store: BlobStore, handle: str, offset: int = 0, length: int = TOOL_RESULT_PAGE_LENGTH) -> str:
+    """Return a page of a stored result with a note where the next page starts."""
+    text = store.get(handle)
+    if text is None:
+        return f"Error: no stored result '{handle}'"
+    offset = max(0, offset)
+    length = max(1, min(length, TOOL_RESULT_PAGE_LENGTH))
+    page = text[offset : offset + length]
+    end = offset + len(page)
+    if end < len(text):
+        return f"{page}\n[characters {offset}-{end} of {len(text)}, next offset {end}]"
+    return f"{page}\n[characters {offset}-{end} of {len(text)}, end of result]"
@@ -0,0 +1,127 @@
+"""
+tool_retrieval.py: BM25 retrieval of the tools relevant to a user message.
+Sending only the top ranked tools instead of all allowed tools keeps the tool schemas of each completion small.
+Run `python -m lazy_mcp.tool_retrieval <agent> <cases.jsonl> [k]` to evaluate the retrieval offline.
+"""
+
+import json
+import math
+import re
+import sys
+from collections import Counter
+from typing import Any
+
+from lazy_mcp.models import ToolRetrievalEvaluation
+from lazy_mcp.tokens import estimate_tools_tokens
+
+# splits snake_case, kebab-case and camelCase identifiers as well as prose into words
+WORD_RE = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split a text into lower case words."""
+    return [word.lower() for word in WORD_RE.findall(text)]
+
+
+def tool_document(tool: dict[str, Any]) -> list[str]:
+    """Return the words describing a tool entry: its name, description and parameter names and descriptions."""
+    function = tool["function"]
+    parts = [function.get("name") or "", function.get("description") or ""]
+    for name, schema in ((function.get("parameters") or {}).get("properties") or {}).items():
+        parts.append(name)
+        if isinstance(schema, dict):
+            parts.append(str(schema.get("description") or ""))
+    # the name is the strongest signal, count it twice
+    return tokenize(parts[0]) + tokenize(" ".join(parts))
+
+
+class ToolRetriever:
+    """Okapi BM25 index over tool entries, built once per tool list."""
+
+    def __init__(self, tools: list[dict[str, Any]], k1: float = 1.5, b: float = 0.75) -> None:
+        """Index the tool entries."""
+        self.k1: float = k1
+        self.b: float = b
+        self.names: list[str] = [tool["function"]["name"] for tool in tools]
+        self.term_counts: list[Counter[str]] = []
+        self.lengths: list[int] = []
+        document_frequency: Counter[str] = Counter()
+        for tool in tools:
+            words = tool_document(tool)
+            counts = Counter(words)
+            self.term_counts.append(counts)
+            self.lengths.append(len(words))
+            document_frequency.update(counts.keys())
+        self.average_length: float = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        n = len(tools)
+        self.idf: dict[str, float] = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> list[float]:
+        """Return the BM25 score of every tool for the query."""
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length) if self.average_length else self.k1
+            scores.append(sum(self.idf[term] * counts[term] * (self.k1 + 1) / (counts[term] + norm) for term in terms))
+        return scores
+
+    def top_k(self, query: str, k: int) -> list[str]:
+        """Return the names of up to k tools matching the query, best first. Empty if no tool matches."""
+        ranked = sorted(zip(self.scores(query), self.names), key=lambda pair: -pair[0])
+        return [name for score, name in ranked[:k] if score > 0]
+
+
+def evaluate(tools: list[dict[str, Any]], cases: list[tuple[str, str]], k: int) -> ToolRetrievalEvaluation:
+    """Measure how often the expected tool is among the top k tools of a query and how many tokens that saves.
+
+    A query without any matching tool falls back to the full list, as in LLMClient.
+    """
+    retriever = ToolRetriever(tools)
+    by_name = {tool["function"]["name"]: tool for tool in tools}
+    full_tokens = estimate_tools_tokens(tools)
+    hits = 0
+    selected_tokens = 0
+    fallbacks = 0
+    for query, expected in cases:
+        names = retriever.top_k(query, k)
+        if not names:
+            fallbacks += 1
+            names = list(by_name)
+        hits += expected in names
+        selected_tokens += estimate_tools_tokens([by_name[name] for name in names])
+    count = len(cases) or 1
+    return ToolRetrievalEvaluation(
+        cases=len(cases),
+        k=k,
+        recall=round(hits / count, 4),
+        fallbacks=fallbacks,
+        full_tool_tokens=full_tokens,
+        mean_selected_tool_tokens=round(selected_tokens / count, 1),
+        tokens_saved_ratio=round(1 - selected_tokens / count / full_tokens, 4) if full_tokens else 0.0,
+    )
+
+
+def _agent_tools(agent: str) -> list[dict[str, Any]]:
+    """Build tool entries from the functions persisted in the configuration of an agent."""
+    from lazy_mcp.agent_store import agent_store
+
+    agent_config = agent_store.load(agent, with_history=False)
+    if agent_config is None:
+        raise SystemExit(f"Agent '{agent}' not found")
+    return [
+        {"type": "function", "function": {"name": name, "description": func.description, "parameters": func.parameters}}
+        for server in agent_config.servers.values()
+        for name, func in (server.functions or {}).items()
+    ]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        raise SystemExit("usage: python -m lazy_mcp.tool_retrieval <agent> <cases.jsonl> [k]")
+    with open(sys.argv[2]) as f:
+        # every line is {"query": "...", "tool": "<expected tool name>"}
+        cases = [(case["query"], case["tool"]) for case in map(json.loads, filter(str.strip, f))]
+    evaluation = evaluate(_agent_tools(sys.argv[1]), cases, int(sys.argv[3]) if len(sys.argv) > 3 else 8)
+    print(evaluation.model_dump_json(indent=2))
@@ -0,0 +1,134 @@
+"""
+tool_schema.py: Compaction of the tool entries sent with every completion.
+Keywords without meaning for the model are dropped, long descriptions truncated, unused or duplicate $defs removed and
+keys sorted, so the serialized tools are small and byte identical across turns.
+"""
+
+import json
+from functools import lru_cache
+from typing import Any
+
+from lazy_mcp.config_utils import TOOL_DESCRIPTION_MAX_LENGTH
+
+# JSON schema keywords that do not change which arguments are valid
+NON_SEMANTIC_KEYS = {
+    "$schema",
+    "$id",
+    "$comment",
+    "title",
+    "examples",
+    "default",
+    "deprecated",
+    "readOnly",
+    "writeOnly",
+}
+# keywords whose values map names to schemas rather than being schemas
+SCHEMA_MAPS = {"properties", "patternProperties", "$defs", "definitions", "dependentSchemas"}
+# keywords whose values are data and are kept verbatim
+LITERAL_KEYS = {"enum", "const", "required"}
+
+
+def truncate(text: str, max_length: int) -> str:
+    """Shorten a text to max_length characters, marking the cut with an ellipsis."""
+    if max_length <= 0 or len(text) <= max_length:
+        return text
+    return text[: max_length - 1].rstrip() + "…"
+
+
+def _compact(node: Any, max_length: int) -> Any:
+    """Recursively drop non-semantic keywords, truncate descriptions and sort keys of a schema node."""
+    if isinstance(node, list):
+        return [_compact(item, max_length) for item in node]
+    if not isinstance(node, dict):
+        return node
+    compact: dict[str, Any] = {}
+    for key in sorted(node):
+        value = node[key]
+        if key in NON_SEMANTIC_KEYS:
+            continue
+        if key == "description" and isinstance(value, str):
+            compact[key] = truncate(value, max_length)
+        elif key in LITERAL_KEYS:
+            compact[key] = value
+        elif key in SCHEMA_MAPS and isinstance(value, dict):
+            compact[key] = {name: _compact(value[name], max_length) for name in sorted(value)}
+        else:
+            compact[key] = _compact(value, max_length)
+    return compact
+
+
+def _rewrite_refs(node: Any, renames: dict[str, str]) -> Any:
+    """Replace $ref targets according to renames."""
+    if isinstance(node, list):
+        return [_rewrite_refs(item, renames) for item in node]
+    if not isinstance(node, dict):
+        return node
+    return {
+        key: renames.get(value, value) if key == "$ref" else _rewrite_refs(value, renames)
+        for key, value in node.items()
+    }
+
+
+def _refs(node: Any) -> set[str]:
+    """Collect all $ref targets of a schema."""
+    if isinstance(node, list):
+        return set().union(*(_refs(item) for item in node)) if node else set()
+    if not isinstance(node, dict):
+        return set()
+    found = {node["$ref"]} if isinstance(node.get("$ref"), str) else set()
+    for value in node.values():
+        found |= _refs(value)
+    return found
+
+
+def _dedupe_defs(schema: dict[str, Any]) -> dict[str, Any]:
+    """Merge identical definitions and drop definitions that are not referenced."""
+    for defs_key in ("$defs", "definitions"):
+        defs = schema.get(defs_key)
+        if not isinstance(defs, dict):
+            continue
+        renames: dict[str, str] = {}
+        seen: dict[str, str] = {}
+        for name, definition in defs.items():
+            canonical = json.dumps(definition, sort_keys=True)
+            if canonical in seen:
+                renames[f"#/{defs_key}/{name}"] = f"#/{defs_key}/{seen[canonical]}"
+            else:
+                seen[canonical] = name
+        if renames:
+            schema = _rewrite_refs(schema, renames)
+        # definitions may reference each other, keep everything reachable from the rest of the schema
+        rest = {key: value for key, value in schema.items() if key != defs_key}
+        reachable = _refs(rest)
+        pending = list(reachable)
+        while pending:
+            ref = pending.pop()
+            name = ref.rsplit("/", 1)[-1]
+            if ref.startswith(f"#/{defs_key}/") and name in schema[defs_key]:
+                for inner in _refs(schema[defs_key][name]) - reachable:
+                    reachable.add(inner)
+                    pending.append(inner)
+        kept = {name: value for name, value in schema[defs_key].items() if f"#/{defs_key}/{name}" in reachable}
+        schema = {**rest, defs_key: kept} if kept else rest
+    return schema
+
+
+@lru_cache(maxsize=4096)
+def _compact_tool_json(raw: str, max_length: int) -> str:
+    """Compact a serialized tool entry, cached so every tool is only compacted once."""
+    tool = json.loads(raw)
+    function = tool["function"]
+    parameters = function.get("parameters")
+    compact_function = {"name": function["name"]}
+    if function.get("description"):
+        compact_function["description"] = truncate(function["description"], max_length)
+    if isinstance(parameters, dict):
+        compact_function["parameters"] = _dedupe_defs(_compact(parameters, max_length))
+    elif parameters is not None:
+        compact_function["parameters"] = parameters
+    return json.dumps({"type": tool.get("type", "function"), "function": compact_function})
+
+
+def compact_tool(tool: dict[str, Any], max_length: int = TOOL_DESCRIPTION_MAX_LENGTH) -> dict[str, Any]:
+    """Return a compacted copy of a tool entry with sorted keys and descriptions of at most max_length characters."""
+    return json.loads(_compact_tool_json(json.dumps(tool, sort_keys=True, default=str), max_length))